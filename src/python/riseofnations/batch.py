@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy
+from .formats.bh3.bh3file import BH3File
+from .formats.bha.bhafile import BHAFile
+from .formats.gltf.bh3gltfconverter import BH3GltfConverter
+
+_extensions = ('.bh3', '.bha')
+
+
+def find_files(directory):
+    """
+    List every BH3 and BHA file under directory, sorted by path
+    """
+    found = []
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in _extensions:
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+
+def read_file(filename, cache=None):
+    """
+    :param cache: ParseCache to use, None for the default cache, or False to disable
+    :return: the BH3File or BHAFile read from filename
+    """
+    if filename.lower().endswith('.bh3'):
+        file = BH3File()
+    else:
+        file = BHAFile()
+    file.read(filename, cache=cache)
+    return file
+
+
+def validate_file(filename):
+    """
+    Check the structure of a BH3 or BHA file
+    :return: list of problems found, empty if the file is valid
+    """
+    errors = []
+    is_bh3 = filename.lower().endswith('.bh3')
+    root_chunk = (BH3File if is_bh3 else BHAFile).read_index(filename)
+    file_size = os.path.getsize(filename)
+    if root_chunk.data_size != file_size:
+        errors.append("root chunk size {} does not match file size {}".format(root_chunk.data_size, file_size))
+    for chunk in root_chunk.walk():
+        if chunk.offset + chunk.data_size > file_size:
+            errors.append("chunk type {} at {} ends past the end of the file".format(chunk.chunk_type, chunk.offset))
+
+    file = read_file(filename)
+    if is_bh3:
+        errors.extend(_validate_bh3(file))
+    elif file.root_bone_track is None:
+        errors.append("no bone tracks")
+    return errors
+
+
+def _validate_bh3(file):
+    errors = []
+    vertex_count = len(file.vertices)
+    if len(file.normals) != vertex_count or len(file.uvs) != vertex_count:
+        errors.append("{} vertices, {} normals and {} uvs".format(vertex_count, len(file.normals), len(file.uvs)))
+    if len(file.faces) and int(numpy.max(file.faces)) >= vertex_count:
+        errors.append("face index {} out of range".format(int(numpy.max(file.faces))))
+    if file.root_bone is None:
+        errors.append("no bones")
+        return errors
+
+    stack = [file.root_bone]
+    while stack:
+        bone = stack.pop()
+        if bone.vertex_count and (bone.vertex_index < 0 or bone.vertex_index + bone.vertex_count > vertex_count):
+            errors.append("bone {} vertex range out of bounds".format(bone.name))
+        stack.extend(bone.children)
+    return errors
+
+
+def output_path(filename, output_directory, root=None, name=None):
+    """
+    Mirror the path of filename relative to root under output_directory, creating the directories it needs
+    :param filename: The input file
+    :param output_directory: The directory for written files
+    :param root: The directory the input files were found in, or None to only keep the file name
+    :param name: File name to write instead of the input's own name
+    :return: The output path
+    """
+    relative = os.path.relpath(filename, root) if root else os.path.basename(filename)
+    if name:
+        relative = os.path.join(os.path.dirname(relative), name)
+    output = os.path.join(output_directory, relative)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    return output
+
+
+def roundtrip_file(filename, output_directory=None, root=None):
+    """
+    Read a file, write it back out, and check that reading the copy gives the same data
+    :param output_directory: keep the copy in this directory, at the file's path relative to root
+    :return: list of differences found, empty if the round-trip succeeded
+    """
+    file = read_file(filename)
+    extension = os.path.splitext(filename)[1]
+    if output_directory:
+        output = output_path(filename, output_directory, root)
+        file.write(output)
+        return _compare(file, read_file(output, cache=False))
+
+    # The copies are read back uncached, so they do not fill the cache with throwaway entries
+    handle, output = tempfile.mkstemp(suffix=extension)
+    os.close(handle)
+    try:
+        file.write(output)
+        return _compare(file, read_file(output, cache=False))
+    finally:
+        os.remove(output)
+
+
+def _compare(expected, actual):
+    errors = []
+    if isinstance(expected, BH3File):
+        for name in ('vertices', 'normals', 'uvs', 'faces'):
+            if not numpy.array_equal(getattr(expected, name), getattr(actual, name)):
+                errors.append("{} differ".format(name))
+        pairs = [(expected.root_bone, actual.root_bone)]
+        fields = ('name', 'vertex_index', 'vertex_count', 'rotation', 'position')
+    else:
+        pairs = [(expected.root_bone_track, actual.root_bone_track)]
+        fields = ()
+
+    while pairs:
+        a, b = pairs.pop()
+        if len(a.children) != len(b.children):
+            errors.append("hierarchy differs")
+            break
+        if any(numpy.any(numpy.asarray(getattr(a, f)) != numpy.asarray(getattr(b, f))) for f in fields):
+            errors.append("bone {} differs".format(a.name))
+        if not fields and a.key_data.tobytes() != b.key_data.tobytes():
+            errors.append("bone track keys differ")
+        pairs.extend(zip(a.children, b.children))
+    return errors
+
+
+def convert_file(filename, output_directory=None, animations=False, root=None):
+    """
+    Convert a BH3 file to .glb next to it, or in output_directory at the file's path relative to root
+    BHA files are skipped since they need a skeleton. With animations, every BHA
+    file in the same directory named <model>_*.bha is added to the .glb.
+    :return: list of problems, empty on success
+    """
+    if not filename.lower().endswith('.bh3'):
+        return []
+
+    directory, name = os.path.split(filename)
+    model_name = os.path.splitext(name)[0]
+    bh3_file = BH3File()
+    bh3_file.read(filename)
+
+    bha_files = {}
+    if animations:
+        prefix = model_name.lower() + '_'
+        for anim in sorted(os.listdir(directory or '.')):
+            anim_name, extension = os.path.splitext(anim)
+            if extension.lower() == '.bha' and anim.lower().startswith(prefix):
+                bha_file = BHAFile()
+                bha_file.read(os.path.join(directory, anim))
+                bha_files[anim_name] = bha_file
+
+    if output_directory:
+        output = output_path(filename, output_directory, root, model_name + '.glb')
+    else:
+        output = os.path.join(directory, model_name + '.glb')
+    BH3GltfConverter(model_name).save(output, bh3_file, bha_files)
+    return []
+
+
+def process_file(command, filename, options):
+    """
+    Run one command on one file, used as the process pool task
+    :return: dict with the filename, its size, the errors, and the elapsed seconds
+    """
+    start_time = time.perf_counter()
+    try:
+        if command == 'validate':
+            errors = validate_file(filename)
+        elif command == 'roundtrip':
+            errors = roundtrip_file(filename, options.get('output'), options.get('root'))
+        else:
+            errors = convert_file(filename, options.get('output'), options.get('animations', False),
+                                  options.get('root'))
+    except Exception as e:
+        errors = ["{}: {}".format(type(e).__name__, e)]
+    return {
+        'file': filename,
+        'size': os.path.getsize(filename),
+        'errors': errors,
+        'seconds': time.perf_counter() - start_time,
+    }
+
+
+def run(command, directory, jobs=None, options=None, progress=None):
+    """
+    Run command on every BH3/BHA file under directory across a process pool
+    :param command: 'validate', 'roundtrip' or 'convert'
+    :param jobs: number of worker processes, None for one per CPU
+    :param options: dict of command options, 'output' and 'animations'.
+    Written files keep their path relative to directory under 'output'.
+    :param progress: optional callable receiving each file result as it finishes
+    :return: report dict with a summary and the per-file results
+    """
+    options = dict(options or {}, root=directory)
+    filenames = find_files(directory)
+    start_time = time.perf_counter()
+    results = []
+
+    if jobs == 1:
+        for filename in filenames:
+            results.append(process_file(command, filename, options))
+            if progress:
+                progress(results[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(process_file, command, filename, options) for filename in filenames]
+            for future in as_completed(futures):
+                results.append(future.result())
+                if progress:
+                    progress(results[-1])
+
+    elapsed = time.perf_counter() - start_time
+    results.sort(key=lambda result: result['file'])
+    total_size = sum(result['size'] for result in results)
+    return {
+        'command': command,
+        'directory': directory,
+        'files': len(results),
+        'failures': sum(1 for result in results if result['errors']),
+        'bytes': total_size,
+        'seconds': elapsed,
+        'files_per_second': len(results) / elapsed if elapsed > 0 else 0.0,
+        'megabytes_per_second': total_size / 1048576 / elapsed if elapsed > 0 else 0.0,
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m riseofnations',
+                                     description="Batch process Rise of Nations BH3 and BHA files.")
+    parser.add_argument('command', choices=('validate', 'roundtrip', 'convert'),
+                        help="validate the files, round-trip them through read and write, or convert BH3 to .glb")
+    parser.add_argument('directory', help="directory to search for BH3/BHA files, such as the game's art folder")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="number of worker processes")
+    parser.add_argument('-o', '--output', default=None, help="directory for written files")
+    parser.add_argument('-a', '--animations', action='store_true',
+                        help="convert: add the <model>_*.bha animations to each .glb")
+    parser.add_argument('-v', '--verbose', action='store_true', help="print the timing of every file")
+    parser.add_argument('--report', default=None, help="write the full report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+
+    def progress(result):
+        if result['errors']:
+            print("FAILED {}: {}".format(result['file'], '; '.join(result['errors'])), file=sys.stderr)
+        elif args.verbose:
+            print("{:10.2f} ms {}".format(result['seconds'] * 1000, result['file']))
+
+    report = run(args.command, args.directory, args.jobs,
+                 {'output': args.output, 'animations': args.animations}, progress)
+
+    print("{} files, {} failed, {:.2f} s, {:.1f} files/s, {:.2f} MB/s".format(
+        report['files'], report['failures'], report['seconds'],
+        report['files_per_second'], report['megabytes_per_second']))
+    for result in sorted(report['results'], key=lambda r: r['seconds'], reverse=True)[:5]:
+        print("  slowest {:10.2f} ms {}".format(result['seconds'] * 1000, result['file']))
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if report['failures'] else 0
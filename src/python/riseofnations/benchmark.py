@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy
+from .batch import validate_file, roundtrip_file
+from .formats.bh3.bh3bone import BH3Bone
+from .formats.bh3.bh3file import BH3File
+from .formats.bha.bhabonetrack import BHABoneTrack
+from .formats.bha.bhabonetrackkey import create_key_data
+from .formats.bha.bhafile import BHAFile
+from .formats import quaternion
+
+# name: (vertices, faces, bones, depth, keys)
+presets = {
+    'small': [(500, 800, 16, 4, 30),
+              (2000, 3000, 40, 6, 60)],
+    'medium': [(10000, 16000, 60, 8, 120),
+               (30000, 50000, 150, 12, 200)],
+    'large': [(60000, 100000, 150, 12, 600),
+              (65535, 200000, 400, 20, 1000)],
+}
+
+
+def make_hierarchy(bone_count, depth, rng):
+    """
+    Create a random bone hierarchy
+    The first depth bones form a chain so the hierarchy is exactly depth bones deep.
+    :return: list of parent indices in depth-first order, -1 for the root
+    """
+    depth = min(max(depth, 2 if bone_count > 1 else 1), bone_count)
+    parents = [-1] + list(range(0, depth - 1))
+    depths = list(range(0, depth))
+    children = [[] for _ in range(0, bone_count)]
+    for bi in range(1, depth):
+        children[bi - 1].append(bi)
+    for bi in range(depth, bone_count):
+        candidates = [ci for ci in range(0, bi) if depths[ci] < depth - 1]
+        parent = candidates[int(rng.integers(len(candidates)))]
+        parents.append(parent)
+        depths.append(depths[parent] + 1)
+        children[parent].append(bi)
+
+    # renumber depth-first so the output matches how files are read
+    order = []
+    stack = [0]
+    while stack:
+        bi = stack.pop()
+        order.append(bi)
+        stack.extend(reversed(children[bi]))
+    new_index = {old: new for new, old in enumerate(order)}
+    return [new_index[parents[old]] if parents[old] >= 0 else -1 for old in order]
+
+
+def _random_rotations(count, rng):
+    return quaternion.normalize(rng.normal(size=(count, 4))).astype(numpy.float32)
+
+
+def make_bh3_file(vertex_count, face_count, bone_count, depth=4, seed=0):
+    """
+    Create a valid BH3 file filled with random data
+    Vertices are split between the bones in contiguous ranges, in depth-first order.
+    :param vertex_count: number of vertices, at most 65536 since faces store 16 bit indices
+    :param face_count: number of triangles
+    :param bone_count: number of bones
+    :param depth: depth of the bone hierarchy
+    :param seed: random seed
+    :return: the BH3File
+    """
+    rng = numpy.random.default_rng(seed)
+    file = BH3File()
+    file.vertices = rng.uniform(-10.0, 10.0, size=(vertex_count, 3)).astype(numpy.float32)
+    normals = rng.normal(size=(vertex_count, 3))
+    file.normals = (normals / numpy.linalg.norm(normals, axis=1, keepdims=True)).astype(numpy.float32)
+    file.uvs = rng.uniform(0.0, 1.0, size=(vertex_count, 2)).astype(numpy.float32)
+    file.faces = rng.integers(0, vertex_count, size=(face_count, 3)).astype(numpy.uint16)
+
+    parents = make_hierarchy(bone_count, depth, rng)
+    splits = numpy.sort(rng.integers(0, vertex_count + 1, size=bone_count - 1))
+    starts = numpy.concatenate(([0], splits))
+    counts = numpy.diff(numpy.concatenate((starts, [vertex_count])))
+    rotations = _random_rotations(bone_count, rng)
+    positions = rng.uniform(-1.0, 1.0, size=(bone_count, 3)).astype(numpy.float32)
+
+    bones = []
+    for bi in range(0, bone_count):
+        bone = BH3Bone()
+        bone.name = "bone{:04d}".format(bi)
+        bone.vertex_index = int(starts[bi])
+        bone.vertex_count = int(counts[bi])
+        bone.rotation = rotations[bi].tolist()
+        bone.position = positions[bi].tolist()
+        if parents[bi] >= 0:
+            bone.parent = bones[parents[bi]]
+            bone.parent.children.append(bone)
+        bones.append(bone)
+    file.root_bone = bones[0]
+    return file
+
+
+def make_bha_file(bone_count, key_count, depth=4, seed=0):
+    """
+    Create a valid BHA file filled with random keys
+    :param bone_count: number of bone tracks
+    :param key_count: number of keys in each track
+    :param depth: depth of the track hierarchy
+    :param seed: random seed
+    :return: the BHAFile
+    """
+    rng = numpy.random.default_rng(seed)
+    parents = make_hierarchy(bone_count, depth, rng)
+    tracks = []
+    for bi in range(0, bone_count):
+        bone_track = BHABoneTrack()
+        key_data = create_key_data(key_count)
+        key_data['time_step'] = 1.0 / 30.0
+        key_data['rotation'] = _random_rotations(key_count, rng)
+        key_data['position'] = rng.uniform(-1.0, 1.0, size=(key_count, 3))
+        bone_track.key_data = key_data
+        if parents[bi] >= 0:
+            bone_track.parent = tracks[parents[bi]]
+            bone_track.parent.children.append(bone_track)
+        tracks.append(bone_track)
+
+    file = BHAFile()
+    file.root_bone_track = tracks[0]
+    return file
+
+
+def _time(function, repeat, setup=None):
+    """
+    Call function repeat times
+    :param setup: optional callable run untimed before each call, its result is passed to function
+    :return: the fastest and median wall time in seconds
+    """
+    times = []
+    for _ in range(0, repeat):
+        args = (setup(),) if setup else ()
+        start_time = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start_time)
+    return min(times), float(numpy.median(times))
+
+
+def _peak_memory(function):
+    """
+    :return: the peak bytes allocated by Python and NumPy while calling function
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_file(name, make_file, file_class, directory, repeat=5):
+    """
+    Time writing, reading, and round-tripping a file, and measure the peak memory of a read
+    Every write is of a new file from make_file, and the last one is also validated and round-tripped.
+    :param make_file: callable creating the file to write
+    :return: dict of results
+    """
+    filename = os.path.join(directory, name)
+    copy = os.path.join(directory, 'copy_' + name)
+
+    def read():
+        file_class().read(filename, cache=False)
+
+    def roundtrip():
+        read_file = file_class()
+        read_file.read(filename, cache=False)
+        read_file.write(copy)
+
+    write_best, write_median = _time(lambda file: file.write(filename), repeat, make_file)
+    read_best, read_median = _time(read, repeat)
+    roundtrip_best, roundtrip_median = _time(roundtrip, repeat)
+    file = make_file()
+    write_peak_bytes = _peak_memory(lambda: file.write(filename))
+    return {
+        'name': name,
+        'bytes': os.path.getsize(filename),
+        'write_seconds': write_best,
+        'write_median_seconds': write_median,
+        'read_seconds': read_best,
+        'read_median_seconds': read_median,
+        'roundtrip_seconds': roundtrip_best,
+        'roundtrip_median_seconds': roundtrip_median,
+        'read_megabytes_per_second': os.path.getsize(filename) / 1048576 / read_best if read_best > 0 else 0.0,
+        'read_peak_bytes': _peak_memory(read),
+        'write_peak_bytes': write_peak_bytes,
+        'errors': validate_file(filename) + roundtrip_file(filename),
+    }
+
+
+def run(cases, repeat=5, seed=0, progress=None):
+    """
+    Generate a BH3 and a BHA file for each case and benchmark them
+    :param cases: list of (vertices, faces, bones, depth, keys) tuples
+    :param repeat: number of timed runs of each operation
+    :param seed: random seed of the generated files
+    :param progress: optional callable receiving each result as it finishes
+    :return: report dict with the environment and the results
+    """
+    results = []
+    directory = tempfile.mkdtemp(prefix='riseofnations_benchmark_')
+    try:
+        for vertex_count, face_count, bone_count, depth, key_count in cases:
+            name = "v{}_f{}_b{}_d{}.bh3".format(vertex_count, face_count, bone_count, depth)
+            result = benchmark_file(name, lambda: make_bh3_file(vertex_count, face_count, bone_count, depth, seed),
+                                    BH3File, directory, repeat)
+            result.update({'format': 'bh3', 'vertices': vertex_count, 'faces': face_count,
+                           'bones': bone_count, 'depth': depth})
+            results.append(result)
+            if progress:
+                progress(result)
+
+            name = "b{}_k{}_d{}.bha".format(bone_count, key_count, depth)
+            result = benchmark_file(name, lambda: make_bha_file(bone_count, key_count, depth, seed),
+                                    BHAFile, directory, repeat)
+            result.update({'format': 'bha', 'bones': bone_count, 'keys': key_count, 'depth': depth})
+            results.append(result)
+            if progress:
+                progress(result)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'seed': seed,
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+    """
+    Compare the results of two runs, matched by name
+    :return: list of (name, field, baseline value, new value) for the timed fields and peak memory
+    """
+    fields = ('write_seconds', 'read_seconds', 'roundtrip_seconds', 'read_peak_bytes', 'write_peak_bytes')
+    baseline_results = {result['name']: result for result in baseline['results']}
+    changes = []
+    for result in report['results']:
+        old = baseline_results.get(result['name'])
+        if old is None:
+            continue
+        for field in fields:
+            if field in old:
+                changes.append((result['name'], field, old[field], result[field]))
+    return changes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m riseofnations.benchmark',
+                                     description="Benchmark reading and writing synthetic BH3 and BHA files.")
+    parser.add_argument('--preset', choices=sorted(presets), default='small', help="set of file sizes to run")
+    parser.add_argument('--case', action='append', default=None, metavar='V,F,B,D,K',
+                        help="custom case: vertices, faces, bones, depth, keys per track; may be repeated")
+    parser.add_argument('-r', '--repeat', type=int, default=5, help="timed runs of each operation")
+    parser.add_argument('--seed', type=int, default=0, help="random seed of the generated files")
+    parser.add_argument('-o', '--output', default=None, help="write the results as JSON to this file")
+    parser.add_argument('--compare', default=None, help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    if args.case:
+        cases = [tuple(int(value) for value in case.split(',')) for case in args.case]
+        if any(len(case) != 5 for case in cases):
+            parser.error("--case takes five comma separated numbers")
+    else:
+        cases = presets[args.preset]
+
+    def progress(result):
+        print("{:28s} {:10d} B  write {:8.2f} ms  read {:8.2f} ms  round-trip {:8.2f} ms  peak {:8.1f} MB".format(
+            result['name'], result['bytes'], result['write_seconds'] * 1000, result['read_seconds'] * 1000,
+            result['roundtrip_seconds'] * 1000, result['read_peak_bytes'] / 1048576))
+        for error in result['errors']:
+            print("  FAILED {}: {}".format(result['name'], error), file=sys.stderr)
+
+    report = run(cases, args.repeat, args.seed, progress)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for name, field, old, new in compare(report, baseline):
+            ratio = new / old if old else float('inf')
+            print("{:28s} {:24s} {:8.2f}x".format(name, field, ratio))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if any(result['errors'] for result in report['results']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,140 +1,196 @@
 import bpy
-from mathutils import Vector
+import numpy
 from ..formats.bh3.bh3bone import BH3Bone
 from ..formats.bh3.bh3file import BH3File
-from time import process_time
+from ..formats.bh3.bh3meshoptimization import optimize_mesh
+from .meshutils import transform_points
+from ..instrumentation import Report
 
 
 class BH3FileExporter:
-    def __init__(self, preserve_uvs):
+    def __init__(self, preserve_uvs, optimize=False):
+        """
+        :param preserve_uvs: Split the vertices on UV seams so that each keeps its own UV
+        :param optimize: Weld identical vertices and reorder the faces and vertices for the vertex cache
+        """
         self._file = None
         self._model = None
         self._mesh = None
         self._uv_loops = None
-        self._normals = []
+        self._normals = None
 
-        self._vertex_count = 0
+        self._coordinates = None
+        self._source_vertices = None
+        self._bone_vertex_counts = None
+        self._bone_rank = 0
         self._vertex_index = 0
-        self._traversed_loops = set()
         self._preserve_uvs = preserve_uvs
+        self._optimize = optimize
 
     def save(self, ctx, filename):
-        start_time = process_time()
+        """
+        Export the active skinned mesh and its armature to a BH3 file
+        :return: Report with the time spent in each phase
+        """
+        report = Report("BH3 export", filename)
         self._file = BH3File()
         self._model = ctx.view_layer.objects.active
-        # self._mesh = object_.data
-        self._mesh = self._model.to_mesh()
-        self._mesh.calc_normals_split()
-
-        uv_layer = self._mesh.uv_layers.active
-        self._uv_loops = uv_layer.data if uv_layer is not None else None
 
+        with report.span("mesh evaluation"):
+            # self._mesh = object_.data
+            self._mesh = self._model.to_mesh()
+            self._mesh.calc_normals_split()
+
+            uv_layer = self._mesh.uv_layers.active
+            self._uv_loops = uv_layer.data if uv_layer is not None else None
+
+        with report.span("normal averaging"):
+            self._normals = self._average_loop_normals()
+
+        with report.span("bone partitioning"):
+            skin_mod = None
+            for modifier in self._model.modifiers:
+                if type(modifier) is bpy.types.ArmatureModifier:
+                    skin_mod = modifier
+                    break
+            skin = skin_mod.object
+            ctx.view_layer.objects.active = skin
+            ctx.view_layer.update()
+            bpy.ops.object.mode_set(mode='EDIT')
+            armature = skin.data
+
+            self._partition_vertices(armature.edit_bones[0])
+            self._file.root_bone = self._create_bh3_bones(armature.edit_bones[0])
+
+        with report.span("faces"):
+            for face in self._mesh.polygons:
+                self._file.faces.append([face.vertices[0],
+                                         face.vertices[1],
+                                         face.vertices[2]])
+
+            bpy.ops.object.mode_set(mode='OBJECT')
+            ctx.view_layer.objects.active = self._model
+            ctx.view_layer.update()
+
+        if self._optimize:
+            with report.span("vertex cache optimization"):
+                vertices_before, vertices_after, acmr_before, acmr_after = optimize_mesh(self._file)
+            print("BH3 mesh optimization welded {:d} of {:d} vertices, ACMR {:.3f} -> {:.3f}".format(
+                vertices_before - vertices_after, vertices_before, acmr_before, acmr_after))
+
+        with report.span("write"):
+            self._file.write(filename)
+
+        return report.finish()
+
+    def _average_loop_normals(self):
+        """
+        Sum the split normals of each vertex's loops and normalize them
+        The sums are accumulated in float32 in loop order, like adding up mathutils Vectors.
+        :return: Vx3 float32 array of vertex normals
+        """
+        loop_count = len(self._mesh.loops)
+        loop_normals = numpy.empty(loop_count * 3, dtype=numpy.float32)
+        loop_vertices = numpy.empty(loop_count, dtype=numpy.int32)
+        self._mesh.loops.foreach_get('normal', loop_normals)
+        self._mesh.loops.foreach_get('vertex_index', loop_vertices)
+
+        normals = numpy.zeros((len(self._mesh.vertices), 3), dtype=numpy.float32)
+        numpy.add.at(normals, loop_vertices, loop_normals.reshape(-1, 3))
+
+        # Same as Vector.normalize, zero length vectors stay zero
+        length_sq = numpy.einsum('ij,ij->i', normals, normals).astype(numpy.float64)
+        scale = numpy.zeros(len(normals), dtype=numpy.float32)
+        numpy.divide(1.0, numpy.sqrt(length_sq), out=scale, where=length_sq > 1.0e-35, casting='unsafe')
+        return normals * scale[:, numpy.newaxis]
+
+    def _partition_vertices(self, root_bone):
+        """
+        Assign every (vertex, uv) pair of the mesh to a bone and an output vertex index
+        A vertex belongs to the first bone, depth first, that has a vertex group containing it.
+        Within a bone, output vertices are ordered by the first loop that uses them.
+        Loops are remapped to the output vertex indices.
+        :param root_bone: The root edit bone of the armature
+        """
+        bone_ranks = dict()
+        stack = [root_bone]
+        while stack:
+            abone = stack.pop()
+            bone_ranks[abone.name] = len(bone_ranks)
+            stack.extend(reversed(abone.children))
+        bone_count = len(bone_ranks)
+
+        # Vertex ownership table, bone_count marks vertices without a bone
+        group_ranks = [bone_ranks.get(group.name, bone_count) for group in self._model.vertex_groups]
+        owners = numpy.full(len(self._mesh.vertices), bone_count, dtype=numpy.int32)
         for v in self._mesh.vertices:
-            average_normal = Vector()
-            for loop in self._mesh.loops:
-                if loop.vertex_index == v.index:
-                    average_normal += loop.normal
-            average_normal.normalize()
-            self._normals.append(average_normal)
-
-        skin_mod = None
-        for modifier in self._model.modifiers:
-            if type(modifier) is bpy.types.ArmatureModifier:
-                skin_mod = modifier
-                break
-        skin = skin_mod.object
-        ctx.view_layer.objects.active = skin
-        ctx.view_layer.update()
-        bpy.ops.object.mode_set(mode='EDIT')
-        armature = skin.data
-
-        self._file.root_bone = self._create_bh3_bones(armature.edit_bones[0])
-
-        for face in self._mesh.polygons:
-            self._file.faces.append([face.vertices[0],
-                                     face.vertices[1],
-                                     face.vertices[2]])
-
-        bpy.ops.object.mode_set(mode='OBJECT')
-        ctx.view_layer.objects.active = self._model
-        ctx.view_layer.update()
-
-        self._file.write(filename)
-
-        print("BH3 export took {:f} seconds".format(process_time() - start_time))
-        return {'FINISHED'}
+            for vg in v.groups:
+                rank = group_ranks[vg.group]
+                if rank < owners[v.index]:
+                    owners[v.index] = rank
+
+        loop_count = len(self._mesh.loops)
+        loop_vertices = numpy.empty(loop_count, dtype=numpy.int32)
+        self._mesh.loops.foreach_get('vertex_index', loop_vertices)
+
+        if self._uv_loops:
+            loop_uvs = numpy.empty(loop_count * 2, dtype=numpy.float32)
+            self._uv_loops.foreach_get('uv', loop_uvs)
+            loop_uvs = loop_uvs.reshape(-1, 2)
+        else:
+            loop_uvs = None
+
+        if self._uv_loops and self._preserve_uvs:
+            # Split vertices on exactly matching UVs, adding 0 folds -0.0 into 0.0
+            uv_bits = (loop_uvs + numpy.float32(0.0)).view(numpy.int32)
+            loop_pairs = numpy.column_stack((loop_vertices, uv_bits))
+            _, first_loops, loop_keys = numpy.unique(loop_pairs, axis=0, return_index=True, return_inverse=True)
+        else:
+            _, first_loops, loop_keys = numpy.unique(loop_vertices, return_index=True, return_inverse=True)
+        loop_keys = loop_keys.reshape(-1)
+
+        key_vertices = loop_vertices[first_loops]
+        key_owners = owners[key_vertices]
+        order = numpy.lexsort((first_loops, key_owners))
+        order = order[key_owners[order] < bone_count]
+
+        new_indices = numpy.full(len(first_loops), -1, dtype=numpy.int32)
+        new_indices[order] = numpy.arange(len(order), dtype=numpy.int32)
+        loop_new_vertices = new_indices[loop_keys]
+        # Loops of vertices without a bone keep their index, the same as before
+        loop_new_vertices = numpy.where(loop_new_vertices >= 0, loop_new_vertices, loop_vertices)
+        self._mesh.loops.foreach_set('vertex_index', loop_new_vertices)
+
+        self._source_vertices = key_vertices[order]
+        self._bone_vertex_counts = numpy.bincount(key_owners[order], minlength=bone_count)
+
+        if loop_uvs is not None:
+            self._file.uvs = loop_uvs[first_loops[order]]
+        else:
+            self._file.uvs = numpy.tile(numpy.array([0, 1], dtype=numpy.float32), (len(order), 1))
+
+        co = numpy.empty(len(self._mesh.vertices) * 3, dtype=numpy.float32)
+        self._mesh.vertices.foreach_get('co', co)
+        self._coordinates = co.reshape(-1, 3)
+        self._file.vertices = numpy.empty((len(order), 3), dtype=numpy.float32)
+        self._file.normals = numpy.empty((len(order), 3), dtype=numpy.float32)
 
     def _create_bh3_bones(self, abone):
         bone = BH3Bone()
         bone.name = abone.name
 
-        bone_vertices = dict()
-        starting_vertex_count = self._vertex_count
+        bone.vertex_index = self._vertex_index
+        bone.vertex_count = int(self._bone_vertex_counts[self._bone_rank])
+        self._bone_rank += 1
+        self._vertex_index += bone.vertex_count
 
         transform_inverse = abone.matrix.inverted()
         nrm_mtx = transform_inverse.transposed().inverted()
 
-        for loop in self._mesh.loops:
-            if not (loop.index in self._traversed_loops):
-                new_vertex_index = -1
-
-                if not (loop.vertex_index in bone_vertices):
-                    # If vertex does not already belong to a bone
-                    for vg in self._mesh.vertices[loop.vertex_index].groups:
-                        # only one bone may take a vertex, so break after first find
-                        if self._model.vertex_groups[vg.group].name == abone.name:
-                            new_vertex_index = self._vertex_count
-                            self._vertex_count += 1
-                            break
-
-                if new_vertex_index >= 0:
-                    # First time this vertex has been seen
-                    self._traversed_loops.add(loop.index)
-                    self._file.vertices.append(
-                        list(transform_inverse @ self._mesh.vertices[loop.vertex_index].co))
-                    self._file.normals.append(list(nrm_mtx @ self._normals[loop.vertex_index]))
-
-                    if self._uv_loops:
-                        uv = tuple(self._uv_loops[loop.index].uv)
-                        self._file.uvs.append(list(uv))
-                        bone_vertices[loop.vertex_index] = {uv: new_vertex_index}
-                    else:
-                        self._file.uvs.append([0, 1])
-                        bone_vertices[loop.vertex_index] = new_vertex_index
-
-                    loop.vertex_index = new_vertex_index
-                elif loop.vertex_index in bone_vertices:
-                    # Second+ time we see this vertex index
-                    self._traversed_loops.add(loop.index)
-                    if not self._uv_loops:
-                        # No UVs, just update the loop vertex_index
-                        loop.vertex_index = bone_vertices[loop.vertex_index]
-                        continue
-
-                    if not self._preserve_uvs:
-                        # Don't care about other UVs, we only want the first one
-                        loop.vertex_index = next(iter(bone_vertices[loop.vertex_index].values()))
-                        continue
-
-                    uv_dict = bone_vertices[loop.vertex_index]
-                    uv = tuple(self._uv_loops[loop.index].uv)
-
-                    # print(str(loop.vertex_index) + ' ' + str(uv_dict))
-
-                    if uv in uv_dict:
-                        # We have UVs, but they have been accounted for
-                        loop.vertex_index = uv_dict[uv]
-                    else:
-                        # Unique UV, copy the vertex to avoid seams
-                        self._file.vertices.append(
-                            list(transform_inverse @ self._mesh.vertices[loop.vertex_index].co))
-                        self._file.normals.append(list(nrm_mtx @ self._normals[loop.vertex_index]))
-                        self._file.uvs.append(list(uv))
-
-                        new_vertex_index = self._vertex_count
-                        self._vertex_count += 1
-                        uv_dict[uv] = new_vertex_index
-                        loop.vertex_index = new_vertex_index
+        block = slice(bone.vertex_index, self._vertex_index)
+        sources = self._source_vertices[block]
+        self._file.vertices[block] = transform_points(transform_inverse, self._coordinates[sources])
+        self._file.normals[block] = transform_points(nrm_mtx, self._normals[sources])
 
         # Calculate the local rotation and position for the bone
         if abone.parent:
@@ -145,10 +201,6 @@ class BH3FileExporter:
             bone.rotation = list(abone.matrix.transposed().to_quaternion())
             bone.position = list(abone.matrix.to_translation())
 
-        bone.vertex_count = self._vertex_count - starting_vertex_count
-        bone.vertex_index = self._vertex_index
-        self._vertex_index += bone.vertex_count
-
         for achild in abone.children:
             child = self._create_bh3_bones(achild)
             child.parent = bone
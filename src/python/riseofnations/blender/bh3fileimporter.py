@@ -1,7 +1,9 @@
 import bpy
+import numpy
 from mathutils import Vector, Quaternion, Matrix
 from ..formats.bh3.bh3file import BH3File
-from time import process_time
+from .meshutils import transform_points
+from ..instrumentation import Report
 import os
 
 
@@ -12,66 +14,103 @@ class BH3FileImporter:
         self._armature = None
         self._import_normals = import_normals
 
-    def load(self, ctx, filename):
-        start_time = process_time()
+    @staticmethod
+    def parse(filename):
+        """
+        Read the file without touching any Blender data, so it can run on a worker thread
+        :return: The BH3File
+        """
+        file = BH3File()
+        file.read(filename)
+        return file
+
+    def load(self, ctx, filename, file=None):
+        """
+        Import the BH3 file as an armature and a skinned mesh
+        :param file: The already parsed BH3File, or None to read it from filename
+        :return: Report with the time spent in each phase
+        """
+        report = Report("BH3 import", filename)
         model_name = os.path.splitext(os.path.basename(filename))[0]
         tex_path = filename[:-3] + "tga"
 
-        self._file = BH3File()
-        self._file.read(filename)
-
-        collection = bpy.data.collections.new(model_name + "_Coll")
-        ctx.scene.collection.children.link(collection)
-
-        self._armature = bpy.data.armatures.new(model_name + "_Arm")
-        skin = bpy.data.objects.new(model_name + "_Skin", self._armature)
-        skin.location = [0, 0, 0]
-        collection.objects.link(skin)
-        ctx.view_layer.objects.active = skin
-        ctx.view_layer.update()
-        bpy.ops.object.mode_set(mode='EDIT')
-        self._create_bones(self._file.root_bone, None)
-
-        # create the mesh
-        bpy.ops.object.mode_set(mode='OBJECT')
-        mesh = bpy.data.meshes.new(model_name + "_Mesh")
-        self._model = bpy.data.objects.new(model_name, mesh)
-        self._model.location = [0, 0, 0]
-        collection.objects.link(self._model)
-        ctx.view_layer.objects.active = self._model
-        ctx.view_layer.update()
-
-        mesh.from_pydata(self._file.vertices, [], self._file.faces)
+        with report.span("parse"):
+            self._file = file if file is not None else self.parse(filename)
+
+        with report.span("armature build"):
+            collection = bpy.data.collections.new(model_name + "_Coll")
+            ctx.scene.collection.children.link(collection)
+
+            self._armature = bpy.data.armatures.new(model_name + "_Arm")
+            skin = bpy.data.objects.new(model_name + "_Skin", self._armature)
+            skin.location = [0, 0, 0]
+            collection.objects.link(skin)
+            ctx.view_layer.objects.active = skin
+            ctx.view_layer.update()
+            bpy.ops.object.mode_set(mode='EDIT')
+            self._create_bones(self._file.root_bone, None)
+
+        with report.span("mesh build"):
+            bpy.ops.object.mode_set(mode='OBJECT')
+            mesh = bpy.data.meshes.new(model_name + "_Mesh")
+            self._model = bpy.data.objects.new(model_name, mesh)
+            self._model.location = [0, 0, 0]
+            collection.objects.link(self._model)
+            ctx.view_layer.objects.active = self._model
+            ctx.view_layer.update()
+
+            loop_vertices = self._build_mesh(mesh)
+
+        with report.span("normals"):
+            if self._import_normals:
+                mesh.normals_split_custom_set_from_vertices(self._file.normals)
+            mesh.use_auto_smooth = True
+
+        with report.span("uvs"):
+            uv_layer = mesh.uv_layers.new(name=model_name + "_UV")
+            loop_uvs = numpy.ascontiguousarray(self._file.uvs[loop_vertices], dtype=numpy.float32)
+            uv_layer.data.foreach_set('uv', loop_uvs.ravel())
+
+        with report.span("vertex groups"):
+            self._create_vertex_groups(self._file.root_bone)
+
+            mod = self._model.modifiers.new(model_name + "_Arm_Mod", 'ARMATURE')
+            mod.object = skin
+            mod.use_bone_envelopes = False
+            mod.use_vertex_groups = True
+
+        with report.span("material"):
+            material = bpy.data.materials.new(model_name + "_Mat")
+            material.use_nodes = True
+            bsdf = material.node_tree.nodes["Principled BSDF"]
+            texture = material.node_tree.nodes.new('ShaderNodeTexImage')
+            if os.path.isfile(tex_path):
+                texture.image = bpy.data.images.load(tex_path)
+            material.node_tree.links.new(bsdf.inputs['Base Color'], texture.outputs['Color'])
+
+            mesh.materials.append(material)
+
+        return report.finish()
+
+    def _build_mesh(self, mesh):
+        """
+        Fill the mesh with the file's vertices and triangles from flat arrays
+        :param mesh: The empty mesh to fill
+        :return: The vertex index of each loop
+        """
+        vertices = numpy.ascontiguousarray(self._file.vertices, dtype=numpy.float32)
+        loop_vertices = numpy.ascontiguousarray(self._file.faces, dtype=numpy.int32).ravel()
+        face_count = len(self._file.faces)
+
+        mesh.vertices.add(len(vertices))
+        mesh.vertices.foreach_set('co', vertices.ravel())
+        mesh.loops.add(len(loop_vertices))
+        mesh.loops.foreach_set('vertex_index', loop_vertices)
+        mesh.polygons.add(face_count)
+        mesh.polygons.foreach_set('loop_start', numpy.arange(0, face_count * 3, 3, dtype=numpy.int32))
+        mesh.polygons.foreach_set('loop_total', numpy.full(face_count, 3, dtype=numpy.int32))
         mesh.update(calc_edges=True)
-        if self._import_normals:
-            mesh.normals_split_custom_set_from_vertices(self._file.normals)
-        mesh.use_auto_smooth = True
-
-        uv_layer = mesh.uv_layers.new(name=model_name + "_UV")
-        uv_loops = uv_layer.data
-
-        for loop in mesh.loops:
-            uv_loops[loop.index].uv = self._file.uvs[loop.vertex_index]
-
-        self._create_vertex_groups(self._file.root_bone)
-
-        mod = self._model.modifiers.new(model_name + "_Arm_Mod", 'ARMATURE')
-        mod.object = skin
-        mod.use_bone_envelopes = False
-        mod.use_vertex_groups = True
-
-        material = bpy.data.materials.new(model_name + "_Mat")
-        material.use_nodes = True
-        bsdf = material.node_tree.nodes["Principled BSDF"]
-        texture = material.node_tree.nodes.new('ShaderNodeTexImage')
-        if os.path.isfile(tex_path):
-            texture.image = bpy.data.images.load(tex_path)
-        material.node_tree.links.new(bsdf.inputs['Base Color'], texture.outputs['Color'])
-
-        mesh.materials.append(material)
-
-        print("BH3 import took {:f} seconds".format(process_time() - start_time))
-        return {'FINISHED'}
+        return loop_vertices
 
     def _create_bones(self, bone, parent):
         abone = self._armature.edit_bones.new(bone.name)
@@ -97,19 +136,16 @@ class BH3FileImporter:
         nrm_mtx.invert()
         nrm_mtx.transpose()
 
-        for vi in range(0, bone.vertex_count):
-            vt_ind = vi + bone.vertex_index
-            self._file.vertices[vt_ind] = list(transform @ Vector(self._file.vertices[vt_ind]))
-            self._file.normals[vt_ind] = list(nrm_mtx @ Vector(self._file.normals[vt_ind]))
+        block = slice(bone.vertex_index, bone.vertex_index + bone.vertex_count)
+        self._file.vertices[block] = transform_points(transform, self._file.vertices[block])
+        self._file.normals[block] = transform_points(nrm_mtx, self._file.normals[block])
 
         for child in bone.children:
             self._create_bones(child, abone)
 
     def _create_vertex_groups(self, bone):
         vertex_group = self._model.vertex_groups.new(name=bone.name)
-        for vt in range(0, bone.vertex_count):
-            vt_ind = vt + bone.vertex_index
-            vertex_group.add([vt_ind], 1.0, 'ADD')
+        vertex_group.add(list(range(bone.vertex_index, bone.vertex_index + bone.vertex_count)), 1.0, 'ADD')
 
         for child in bone.children:
             self._create_vertex_groups(child)
@@ -1,48 +1,91 @@
 import bpy
+import numpy
+from math import floor
+from ..formats import quaternion
 from ..formats.bha.bhafile import BHAFile
 from ..formats.bha.bhabonetrack import BHABoneTrack
-from time import process_time
+from ..formats.bha.bhabonetrackkey import create_key_data
+from ..formats.bha.bhakeyreduction import reduce_bone_tracks
+from ..instrumentation import Report
 
 
 class BHAFileExporter:
-    def __init__(self):
+    def __init__(self, sample_curves=False, reduce_keys=False, position_tolerance=0.001, rotation_tolerance=0.001):
+        """
+        :param sample_curves: Read the keys from the F-curves with fcurve.evaluate instead of evaluating the scene
+        :param reduce_keys: Drop keys that interpolating their neighbours rebuilds within the tolerances
+        :param position_tolerance: Largest position error of a dropped key
+        :param rotation_tolerance: Largest rotation error of a dropped key, in radians
+        """
         self._file = None
         self._scene = None
         self._skin = None
         self._action = None
         self._fps = 30
+        self._sample_curves = sample_curves
+        self._reduce_keys = reduce_keys
+        self._position_tolerance = position_tolerance
+        self._rotation_tolerance = rotation_tolerance
+
+        self._bone_fcurves = dict()
+        self._bone_tracks = []
 
     def save(self, ctx, filename):
-        start_time = process_time()
+        """
+        Export the action of the active armature to a BHA file
+        :return: Report with the time spent in each phase
+        """
+        report = Report("BHA export", filename)
         self._file = BHAFile()
+        self._bone_tracks = []
         self._scene = ctx.scene
 
         self._skin = ctx.view_layer.objects.active
         self._action = self._skin.animation_data.action
         self._fps = self._scene.render.fps
 
-        bpy.ops.object.mode_set(mode='OBJECT')
-        self._file.root_bone_track = self._create_bone_tracks(self._skin.pose.bones[0])
-        self._file.write(filename)
+        with report.span("keyframe index"):
+            bpy.ops.object.mode_set(mode='OBJECT')
+            self._index_fcurves()
+            self._file.root_bone_track = self._create_bone_tracks(self._skin.pose.bones[0])
 
-        print("BHA export took {:f} seconds".format(process_time() - start_time))
-        return {'FINISHED'}
+        with report.span("keyframe sampling"):
+            if self._sample_curves:
+                for pose_bone, bone_track, frames in self._bone_tracks:
+                    self._evaluate_curves(pose_bone, bone_track, frames)
+            else:
+                self._sample_scene()
 
-    def _create_bone_tracks(self, pose_bone):
-        bone_track = BHABoneTrack()
+        if self._reduce_keys:
+            with report.span("key reduction"):
+                keys_before, keys_after = reduce_bone_tracks(self._file.root_bone_track,
+                                                             self._position_tolerance, self._rotation_tolerance)
+            print("BHA key reduction kept {:d} of {:d} keys ({:.2f}x smaller)".format(
+                keys_after, keys_before, keys_before / max(keys_after, 1)))
 
-        keyframes = self._get_bone_keyframe_times(pose_bone)
-        base_time = 0  # keyframes.pop(0)
-        bone_track.add_keys(len(keyframes))
+        with report.span("write"):
+            self._file.write(filename)
 
-        for bone_track_key, frame in zip(bone_track.keys, keyframes):
-            self._scene.frame_set(frame)
+        return report.finish()
 
-            bone_track_key.time_step = (frame - base_time) / self._fps
-            bone_track_key.rotation = pose_bone.rotation_quaternion.inverted()
-            bone_track_key.position = list(pose_bone.location)
+    def _index_fcurves(self):
+        """
+        Group the action's F-curves by the name of the pose bone they animate
+        """
+        self._bone_fcurves = dict()
+        for fcu in self._action.fcurves:
+            if fcu.data_path.startswith("pose.bones["):
+                bone_name = fcu.data_path.split("\"")[1]
+                self._bone_fcurves.setdefault(bone_name, []).append(fcu)
+
+    def _create_bone_tracks(self, pose_bone):
+        bone_track = BHABoneTrack()
 
-            base_time = frame
+        frames = self._get_bone_keyframe_times(pose_bone)
+        key_data = create_key_data(len(frames))
+        key_data['time_step'] = numpy.diff(frames, prepend=0) / self._fps
+        bone_track.key_data = key_data
+        self._bone_tracks.append((pose_bone, bone_track, frames))
 
         for pose_bone_child in pose_bone.children:
             child = self._create_bone_tracks(pose_bone_child)
@@ -52,9 +95,48 @@ class BHAFileExporter:
         return bone_track
 
     def _get_bone_keyframe_times(self, pose_bone):
-        keyframes = set()
-        for fcu in self._action.fcurves:
-            if fcu.data_path.split("\"")[1] == pose_bone.name:
-                for keyframe in fcu.keyframe_points:
-                    keyframes.add(keyframe.co[0])
-        return sorted(keyframes)
+        keyframes = [numpy.empty(0)]
+        for fcu in self._bone_fcurves.get(pose_bone.name, ()):
+            co = numpy.empty(len(fcu.keyframe_points) * 2, dtype=numpy.float32)
+            fcu.keyframe_points.foreach_get('co', co)
+            keyframes.append(co[0::2])
+        return numpy.unique(numpy.concatenate(keyframes)).astype(numpy.float64)
+
+    def _sample_scene(self):
+        """
+        Evaluate the scene once per distinct keyframe time and sample every bone keyed at that time
+        """
+        frame_keys = dict()
+        for pose_bone, bone_track, frames in self._bone_tracks:
+            for ki, frame in enumerate(frames.tolist()):
+                frame_keys.setdefault(frame, []).append((pose_bone, ki, bone_track.key_data))
+
+        for frame in sorted(frame_keys):
+            self._scene.frame_set(int(floor(frame)), subframe=frame - floor(frame))
+            for pose_bone, ki, key_data in frame_keys[frame]:
+                key_data['rotation'][ki] = tuple(pose_bone.rotation_quaternion.inverted())
+                key_data['position'][ki] = tuple(pose_bone.location)
+
+    def _evaluate_curves(self, pose_bone, bone_track, frames):
+        """
+        Sample a bone's location and rotation curves at its keyframe times without evaluating the scene
+        Channels without an F-curve keep the pose bone's current value.
+        :param pose_bone: The pose bone
+        :param bone_track: The bone track to fill
+        :param frames: The keyframe times of the bone
+        """
+        channels = numpy.empty((len(frames), 7))
+        channels[:, 0:3] = tuple(pose_bone.location)
+        channels[:, 3:7] = tuple(pose_bone.rotation_quaternion)
+
+        for fcu in self._bone_fcurves.get(pose_bone.name, ()):
+            if fcu.data_path.endswith(".location"):
+                column = fcu.array_index
+            elif fcu.data_path.endswith(".rotation_quaternion"):
+                column = 3 + fcu.array_index
+            else:
+                continue
+            channels[:, column] = [fcu.evaluate(frame) for frame in frames.tolist()]
+
+        bone_track.key_data['position'] = channels[:, 0:3]
+        bone_track.key_data['rotation'] = quaternion.inverse(channels[:, 3:7])
@@ -1,7 +1,10 @@
 import bpy
-from mathutils import Quaternion
+import numpy
+from math import ceil
+from ..formats import quaternion
 from ..formats.bha.bhafile import BHAFile
-from time import process_time
+from ..instrumentation import Report
+from .parsing import parse_files
 import os
 
 
@@ -13,74 +16,171 @@ class BHAFileImporter:
         self._fps = 30
         self._stabilize_quaternions = stabilize_quaternions
 
-    def load(self, ctx, filename):
-        start_time = process_time()
+    @staticmethod
+    def parse(filename):
+        """
+        Read the file without touching any Blender data, so it can run on a worker thread
+        :return: The BHAFile
+        """
+        file = BHAFile()
+        file.read(filename)
+        return file
+
+    def load(self, ctx, filename, file=None):
+        """
+        Import the BHA file as a new action on the active armature
+        :param file: The already parsed BHAFile, or None to read it from filename
+        :return: Report with the time spent in each phase
+        """
+        report = Report("BHA import", filename)
         anim_name = os.path.splitext(os.path.basename(filename))[0]
 
-        self._file = BHAFile()
-        self._file.read(filename)
+        with report.span("parse"):
+            self._file = file if file is not None else self.parse(filename)
 
-        self._skin = ctx.view_layer.objects.active
-        if not self._skin.animation_data:
-            self._skin.animation_data_create()
-        self._action = bpy.data.actions.new(name=anim_name)
-        self._skin.animation_data.action = self._action
+        with report.span("keyframe insert"):
+            self._skin = ctx.view_layer.objects.active
+            if not self._skin.animation_data:
+                self._skin.animation_data_create()
+            self._action = bpy.data.actions.new(name=anim_name)
+            # Keep the action when a later import replaces it as the active one
+            self._action.use_fake_user = True
+            self._skin.animation_data.action = self._action
 
-        bpy.ops.object.mode_set(mode='OBJECT')
-        self._fps = 30
-        ctx.scene.render.fps = self._fps
-        self._animate_bone(self._file.root_bone_track, self._skin.pose.bones[0])
-        ctx.scene.frame_end = self._action.frame_range[1]
-        ctx.scene.frame_start = 0
-
-        print("BHA import took {:f} seconds".format(process_time() - start_time))
-        return {'FINISHED'}
-
-    def _animate_bone(self, bone, pose_bone):
-        data_path_loc = "pose.bones[\"%s\"].location" % pose_bone.name
-        data_path_rot = "pose.bones[\"%s\"].rotation_quaternion" % pose_bone.name
-
-        pos_curve_x = self._action.fcurves.new(data_path=data_path_loc, index=0)
-        pos_curve_y = self._action.fcurves.new(data_path=data_path_loc, index=1)
-        pos_curve_z = self._action.fcurves.new(data_path=data_path_loc, index=2)
-        rot_curve_w = self._action.fcurves.new(data_path=data_path_rot, index=0)
-        rot_curve_x = self._action.fcurves.new(data_path=data_path_rot, index=1)
-        rot_curve_y = self._action.fcurves.new(data_path=data_path_rot, index=2)
-        rot_curve_z = self._action.fcurves.new(data_path=data_path_rot, index=3)
-
-        time = 0
-        qs = QuaternionStabilizer()
-        for key in bone.keys:
-            time += round(self._fps * key.time_step, 5)
-            if self._stabilize_quaternions:
-                rotation = qs.stabilize(Quaternion(key.rotation).inverted())
-            else:
-                rotation = Quaternion(key.rotation).inverted()
-            pos_curve_x.keyframe_points.insert(time, key.position[0])
-            pos_curve_y.keyframe_points.insert(time, key.position[1])
-            pos_curve_z.keyframe_points.insert(time, key.position[2])
-            rot_curve_w.keyframe_points.insert(time, rotation[0])
-            rot_curve_x.keyframe_points.insert(time, rotation[1])
-            rot_curve_y.keyframe_points.insert(time, rotation[2])
-            rot_curve_z.keyframe_points.insert(time, rotation[3])
-
-        for child_bone, child_pose_bone in zip(bone.children, pose_bone.children):
-            self._animate_bone(child_bone, child_pose_bone)
-
-
-class QuaternionStabilizer:
-    def __init__(self):
-        self.old = None
-
-    def stabilize(self, q):
-        if not self.old:
-            rval = q
-        else:
-            d1 = (self.old - q).magnitude
-            d2 = (self.old + q).magnitude
-            if d1 < d2:
-                rval = q
-            else:
-                rval = -q
-        self.old = rval
-        return rval
+            bpy.ops.object.mode_set(mode='OBJECT')
+            self._fps = 30
+            ctx.scene.render.fps = self._fps
+            self._animate_file(self._file, self._action, self._map_pose_bones())
+            ctx.scene.frame_end = self._action.frame_range[1]
+            ctx.scene.frame_start = 0
+
+        return report.finish()
+
+    def load_library(self, ctx, filenames, files=None, use_nla=True):
+        """
+        Import several BHA files of the same skeleton onto the active armature, each as its own action
+        The track to pose bone mapping is computed once and reused for every file.
+        :param filenames: The BHA files, in the order their strips are placed
+        :param files: The already parsed BHAFiles in the same order, or None to read them on a thread pool
+        :param use_nla: Place the actions back to back as strips on a new NLA track, otherwise only keep the actions
+        :return: Report with the time spent in each phase
+        """
+        report = Report("BHA library import", os.path.dirname(filenames[0]) if filenames else "")
+
+        with report.span("parse"):
+            if files is None:
+                files = []
+                for filename, file, error in parse_files(self.parse, filenames):
+                    if error is not None:
+                        raise error
+                    files.append(file)
+
+        with report.span("bone mapping"):
+            self._skin = ctx.view_layer.objects.active
+            if not self._skin.animation_data:
+                self._skin.animation_data_create()
+            bpy.ops.object.mode_set(mode='OBJECT')
+            self._fps = 30
+            ctx.scene.render.fps = self._fps
+            bone_names = self._map_pose_bones()
+
+        with report.span("keyframe insert"):
+            actions = []
+            for filename, file in zip(filenames, files):
+                action = bpy.data.actions.new(name=os.path.splitext(os.path.basename(filename))[0])
+                # Keep the actions even though nothing uses them directly
+                action.use_fake_user = True
+                self._animate_file(file, action, bone_names)
+                actions.append(action)
+
+        if use_nla and actions:
+            with report.span("nla strips"):
+                animation_data = self._skin.animation_data
+                if animation_data.action is not None:
+                    # The active action would override the strips
+                    animation_data.action.use_fake_user = True
+                    animation_data.action = None
+
+                nla_track = animation_data.nla_tracks.new()
+                nla_track.name = "BHA Library"
+                start = 0
+                for action in actions:
+                    strip = nla_track.strips.new(action.name, start, action)
+                    start = int(ceil(strip.frame_end))
+                ctx.scene.frame_start = 0
+                ctx.scene.frame_end = start
+
+        return report.finish()
+
+    def _map_pose_bones(self):
+        """
+        Map the path of every pose bone to its name
+        A path lists the child positions from the root, so the third child of the root's first child is (0, 2).
+        Bone tracks are matched to pose bones by the same path.
+        """
+        bone_names = dict()
+        stack = [((), self._skin.pose.bones[0])]
+        while stack:
+            path, pose_bone = stack.pop()
+            bone_names[path] = pose_bone.name
+            stack.extend((path + (ci,), child) for ci, child in enumerate(pose_bone.children))
+        return bone_names
+
+    def _animate_file(self, file, action, bone_names):
+        """
+        Create the curves of every bone track that has a matching pose bone
+        :param file: The BHAFile
+        :param action: The action to add the curves to
+        :param bone_names: The mapping from _map_pose_bones
+        """
+        stack = [((), file.root_bone_track)]
+        while stack:
+            path, bone_track = stack.pop()
+            bone_name = bone_names.get(path)
+            if bone_name is None:
+                continue
+            self._animate_bone(action, bone_track, bone_name)
+            stack.extend((path + (ci,), child) for ci, child in enumerate(bone_track.children))
+
+    def _animate_bone(self, action, bone, bone_name):
+        data_path_loc = "pose.bones[\"%s\"].location" % bone_name
+        data_path_rot = "pose.bones[\"%s\"].rotation_quaternion" % bone_name
+
+        pos_curve_x = action.fcurves.new(data_path=data_path_loc, index=0)
+        pos_curve_y = action.fcurves.new(data_path=data_path_loc, index=1)
+        pos_curve_z = action.fcurves.new(data_path=data_path_loc, index=2)
+        rot_curve_w = action.fcurves.new(data_path=data_path_rot, index=0)
+        rot_curve_x = action.fcurves.new(data_path=data_path_rot, index=1)
+        rot_curve_y = action.fcurves.new(data_path=data_path_rot, index=2)
+        rot_curve_z = action.fcurves.new(data_path=data_path_rot, index=3)
+
+        key_data = bone.key_data
+        times = numpy.cumsum(numpy.round(self._fps * key_data['time_step'].astype(numpy.float64), 5))
+        rotations = quaternion.inverse(key_data['rotation'])
+        if self._stabilize_quaternions:
+            rotations = quaternion.make_continuous(rotations)
+        positions = key_data['position']
+
+        # Inserting at an existing frame replaces that key, so only the last key of equal times is kept
+        last = numpy.ones(len(times), dtype=bool)
+        last[:-1] = times[1:] != times[:-1]
+        times = times[last]
+        curves = (pos_curve_x, pos_curve_y, pos_curve_z, rot_curve_w, rot_curve_x, rot_curve_y, rot_curve_z)
+        values = numpy.hstack((positions, rotations))[last]
+        for i, curve in enumerate(curves):
+            self._set_keyframes(curve, times, values[:, i])
+
+    @staticmethod
+    def _set_keyframes(curve, times, values):
+        """
+        Add all keyframes to an empty curve at once
+        :param curve: The F-curve to fill
+        :param times: Frame of each key
+        :param values: Value of each key
+        """
+        co = numpy.empty((len(times), 2), dtype=numpy.float32)
+        co[:, 0] = times
+        co[:, 1] = values
+        curve.keyframe_points.add(len(co))
+        curve.keyframe_points.foreach_set('co', co.ravel())
+        curve.update()
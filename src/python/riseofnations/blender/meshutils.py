@@ -0,0 +1,17 @@
+import numpy
+
+
+def transform_points(matrix, points):
+    """
+    Multiply an Nx3 array of points by a matrix, the same way Matrix @ Vector does
+    Products are taken in float32 and summed in float64, a 4x4 matrix treats the points as w = 1.
+    :param matrix: A 3x3 or 4x4 mathutils Matrix or numpy array
+    :param points: Nx3 array of points
+    :return: Nx3 float32 array of transformed points
+    """
+    matrix = numpy.asarray(matrix, dtype=numpy.float32)
+    points = numpy.asarray(points, dtype=numpy.float32).reshape(-1, 3)
+    if matrix.shape[1] == 4:
+        points = numpy.hstack((points, numpy.ones((len(points), 1), dtype=numpy.float32)))
+    products = points[:, numpy.newaxis, :] * matrix[numpy.newaxis, :3, :]
+    return numpy.sum(products, axis=2, dtype=numpy.float64).astype(numpy.float32)
@@ -0,0 +1,299 @@
+import bpy
+import os
+from bpy_extras.io_utils import ImportHelper, ExportHelper
+from bpy.props import StringProperty, BoolProperty, EnumProperty, FloatProperty, CollectionProperty
+from bpy.types import Operator, OperatorFileListElement
+from .parsing import parse_files
+
+
+def selected_filenames(operator):
+    """
+    :return: The paths of the operator's selected files, or its filepath if only one was given
+    """
+    if operator.files and operator.files[0].name:
+        return [os.path.join(operator.directory, file.name) for file in operator.files]
+    return [operator.filepath]
+
+
+def import_files(operator, context, importer):
+    """
+    Parse the operator's selected files on worker threads, and build them on the main thread in selection order
+    :param operator: The import operator, with files, directory, and filepath properties
+    :param context: The Blender context
+    :param importer: BH3FileImporter or BHAFileImporter
+    :return: The operator result
+    """
+    filenames = selected_filenames(operator)
+
+    wm = context.window_manager
+    wm.progress_begin(0, len(filenames))
+    imported = 0
+    try:
+        for done, (filename, file, error) in enumerate(parse_files(importer.parse, filenames), 1):
+            if error is not None:
+                operator.report({'WARNING'}, "Could not read {}: {}".format(filename, error))
+            else:
+                report = importer.load(context, filename, file)
+                imported += 1
+                if len(filenames) == 1:
+                    operator.report({'INFO'}, report.summary())
+            wm.progress_update(done)
+    finally:
+        wm.progress_end()
+
+    if len(filenames) > 1:
+        operator.report({'INFO'}, "Imported {} of {} files".format(imported, len(filenames)))
+    return {'FINISHED'} if imported else {'CANCELLED'}
+
+
+def import_library(operator, context, importer, use_nla):
+    """
+    Import the operator's selected BHA files, or every BHA file in its directory if none are selected,
+    as separate actions on the active armature
+    :param operator: The import operator, with files, directory, and filepath properties
+    :param context: The Blender context
+    :param importer: BHAFileImporter
+    :param use_nla: Place the actions back to back on an NLA track
+    :return: The operator result
+    """
+    if operator.files and operator.files[0].name:
+        filenames = sorted(selected_filenames(operator))
+    else:
+        directory = operator.directory or os.path.dirname(operator.filepath)
+        filenames = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                           if name.lower().endswith('.bha'))
+    if not filenames:
+        operator.report({'WARNING'}, "No BHA files found")
+        return {'CANCELLED'}
+
+    parsed_filenames = []
+    files = []
+    for filename, file, error in parse_files(importer.parse, filenames):
+        if error is not None:
+            operator.report({'WARNING'}, "Could not read {}: {}".format(filename, error))
+        else:
+            parsed_filenames.append(filename)
+            files.append(file)
+    if not files:
+        return {'CANCELLED'}
+
+    report = importer.load_library(context, parsed_filenames, files, use_nla)
+    operator.report({'INFO'}, "Imported {} of {} files. {}".format(len(files), len(filenames), report.summary()))
+    return {'FINISHED'}
+
+
+class ImportBH3(Operator, ImportHelper):
+    """Load one or more Rise of Nations BH3 files"""
+    bl_idname = "import_scene.bh3"  # important since its how bpy.ops.import_test.some_data is constructed
+    bl_label = "Import BH3"
+
+    # ImportHelper mixin class uses this
+    filename_ext = ".BH3"
+
+    filter_glob: StringProperty(
+        default="*.BH3",
+        options={'HIDDEN'},
+    )
+
+    files: CollectionProperty(
+        type=OperatorFileListElement,
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    directory: StringProperty(
+        subtype='DIR_PATH',
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    # List of operator properties, the attributes will be assigned
+    # to the class instance from the operator settings before calling.
+    import_normals: BoolProperty(
+       name="Import Normals",
+       description="Import the normals from the file",
+       default=True,
+    )
+
+    #    type = EnumProperty(
+    #            name="Example Enum",
+    #            description="Choose between two items",
+    #            items=(('OPT_A', "First Option", "Description one"),
+    #                   ('OPT_B', "Second Option", "Description two")),
+    #            default='OPT_A',
+    #            )
+
+    def execute(self, context):
+        from .bh3fileimporter import BH3FileImporter
+        return import_files(self, context, BH3FileImporter(self.import_normals))
+
+
+class ExportBH3(Operator, ExportHelper):
+    """Save a Rise of Nations BH3 file"""
+    bl_idname = "export_scene.bh3"
+    bl_label = "Export BH3"
+
+    # ExportHelper mixin class uses this
+    filename_ext = ".BH3"
+
+    filter_glob: StringProperty(
+        default="*.BH3",
+        options={'HIDDEN'},
+    )
+
+    preserve_uvs: BoolProperty(
+        name="Preserve UVs",
+        description="Duplicate the mesh vertices so that they have 1:1 correspondence with their UVs",
+        default=False,
+    )
+
+    optimize_mesh: BoolProperty(
+        name="Optimize Mesh",
+        description="Weld identical vertices of each bone and reorder the triangles for the GPU vertex cache",
+        default=False,
+    )
+
+    def execute(self, context):
+        from .bh3fileexporter import BH3FileExporter
+        file_exporter = BH3FileExporter(self.preserve_uvs, self.optimize_mesh)
+        report = file_exporter.save(context, self.filepath)
+        self.report({'INFO'}, report.summary())
+        return {'FINISHED'}
+
+
+class ImportBHA(Operator, ImportHelper):
+    """Load one or more Rise of Nations BHA files"""
+    bl_idname = "import_anim.bha"  # important since its how bpy.ops.import_test.some_data is constructed
+    bl_label = "Import BHA"
+
+    # ImportHelper mixin class uses this
+    filename_ext = ".BHA"
+
+    filter_glob: StringProperty(
+        default="*.BHA",
+        options={'HIDDEN'},
+    )
+
+    files: CollectionProperty(
+        type=OperatorFileListElement,
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    directory: StringProperty(
+        subtype='DIR_PATH',
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+
+    stabilize_quaternions: BoolProperty(
+       name="Stabilize Quaternions",
+       description="Import each quaternion as the shortest arc from the previous keyframe",
+       default=True,
+    )
+
+    import_mode: EnumProperty(
+        name="Import Mode",
+        description="How to add the animations to the active armature",
+        items=(('ACTIVE', "Active Action", "Make each file the armature's active action"),
+               ('ACTIONS', "Action Library", "Keep each file as a separate action, importing the whole "
+                                             "directory if no file is selected"),
+               ('NLA', "NLA Strips", "Place each file's action back to back on an NLA track, importing the whole "
+                                     "directory if no file is selected")),
+        default='ACTIVE',
+    )
+
+    def execute(self, context):
+        from .bhafileimporter import BHAFileImporter
+        importer = BHAFileImporter(self.stabilize_quaternions)
+        if self.import_mode == 'ACTIVE':
+            return import_files(self, context, importer)
+        return import_library(self, context, importer, self.import_mode == 'NLA')
+
+
+class ExportBHA(Operator, ExportHelper):
+    """Save a Rise of Nations BHA file"""
+    bl_idname = "export_anim.bha"
+    bl_label = "Export BHA"
+
+    # ExportHelper mixin class uses this
+    filename_ext = ".BHA"
+
+    filter_glob: StringProperty(
+        default="*.BHA",
+        options={'HIDDEN'},
+    )
+
+    sample_curves: BoolProperty(
+        name="Sample F-Curves",
+        description="Read the keys directly from the action's F-curves instead of evaluating the scene at each frame",
+        default=False,
+    )
+
+    reduce_keys: BoolProperty(
+        name="Reduce Keys",
+        description="Drop keys that interpolating the neighbouring keys rebuilds within the tolerances",
+        default=False,
+    )
+
+    position_tolerance: FloatProperty(
+        name="Position Tolerance",
+        description="Largest position error allowed for a dropped key",
+        default=0.001,
+        min=0.0,
+    )
+
+    rotation_tolerance: FloatProperty(
+        name="Rotation Tolerance",
+        description="Largest rotation error allowed for a dropped key",
+        default=0.001,
+        min=0.0,
+        subtype='ANGLE',
+    )
+
+    def execute(self, context):
+        from .bhafileexporter import BHAFileExporter
+        file_exporter = BHAFileExporter(self.sample_curves, self.reduce_keys,
+                                        self.position_tolerance, self.rotation_tolerance)
+        report = file_exporter.save(context, self.filepath)
+        self.report({'INFO'}, report.summary())
+        return {'FINISHED'}
+
+
+# Only needed if you want to add into a dynamic menu
+def menu_func_import(self, context):
+    self.layout.operator(ImportBH3.bl_idname, text="Rise of Nations (.BH3)")
+
+
+def menu_func_export(self, context):
+    self.layout.operator(ExportBH3.bl_idname, text="Rise of Nations (.BH3)")
+
+
+def menu_func_import_bha(self, context):
+    self.layout.operator(ImportBHA.bl_idname, text="Rise of Nations (.BHA)")
+
+
+def menu_func_export_bha(self, context):
+    self.layout.operator(ExportBHA.bl_idname, text="Rise of Nations (.BHA)")
+
+classes = (
+    ImportBH3,
+    ExportBH3,
+    ImportBHA,
+    ExportBHA
+)
+
+def register():
+    from bpy.utils import register_class
+    for cl in classes:
+        register_class(cl)
+    bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
+    bpy.types.TOPBAR_MT_file_export.append(menu_func_export)
+    bpy.types.TOPBAR_MT_file_import.append(menu_func_import_bha)
+    bpy.types.TOPBAR_MT_file_export.append(menu_func_export_bha)
+
+
+def unregister():
+    from bpy.utils import unregister_class
+    for cl in reversed(classes):
+        unregister_class(cl)
+    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
+    bpy.types.TOPBAR_MT_file_export.remove(menu_func_export)
+    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import_bha)
+    bpy.types.TOPBAR_MT_file_export.remove(menu_func_export_bha)
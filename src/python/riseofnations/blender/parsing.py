@@ -0,0 +1,22 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_files(parse, filenames):
+    """
+    Parse files on worker threads, giving the results back in the order of filenames
+    Each result is given as soon as it and the ones before it are ready, so the caller can
+    build a file into the scene while the following ones are still being read.
+    :param parse: Function reading one file without touching Blender data, such as BHAFileImporter.parse
+    :param filenames: The files to read
+    :return: generator of (filename, file, error), file is None and error the exception if the file could not be read
+    """
+    if not filenames:
+        return
+    with ThreadPoolExecutor(max_workers=min(len(filenames), os.cpu_count() or 1)) as executor:
+        futures = [executor.submit(parse, filename) for filename in filenames]
+        for filename, future in zip(filenames, futures):
+            try:
+                yield filename, future.result(), None
+            except Exception as e:
+                yield filename, None, e
@@ -0,0 +1,79 @@
+import mmap
+import os
+from contextlib import contextmanager
+import numpy
+from .binaryreader import BinaryReader
+from .binarystructs import array_dtype
+
+
+class BinaryBufferReader(BinaryReader):
+    def __init__(self, buffer, byteorder='<', offset=0):
+        """
+        BinaryReader over an in-memory buffer, values are unpacked in place at an internal offset
+        :param buffer: bytes-like object such as bytes, bytearray, memoryview, or mmap
+        :param byteorder: use '<' for little-endian, and '>' for big-endian
+        :param offset: byte offset in the buffer to start reading from
+        """
+        super().__init__(None, byteorder)
+        self.buffer = buffer
+        self.offset = offset
+
+    def _unpack(self, s):
+        if self.offset + s.size > len(self.buffer):
+            raise EOFError("Unexpected end of buffer while reading {}".format(s.format))
+        data = s.unpack_from(self.buffer, self.offset)
+        self.offset += s.size
+        return data
+
+    def read_bytes(self, count):
+        end = self.offset + count
+        if end > len(self.buffer):
+            raise EOFError("Unexpected end of buffer while reading {} bytes".format(count))
+        data = bytes(self.buffer[self.offset:end])
+        self.offset = end
+        return data
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            self.offset = offset
+        elif whence == 1:
+            self.offset += offset
+        else:
+            self.offset = len(self.buffer) + offset
+        return self.offset
+
+    def tell(self):
+        return self.offset
+
+    def read_array(self, fmt, count):
+        """
+        Read an array of a single struct format character
+        :param fmt: struct format character such as 'f' or 'H'
+        :param count: number of elements, or the shape of the returned array
+        :return: writable numpy array, copied out of the buffer
+        """
+        dtype = numpy.dtype(array_dtype(self.byteorder, fmt))
+        shape = count if isinstance(count, tuple) else (count,)
+        size = int(numpy.prod(shape))
+        if self.offset + size * dtype.itemsize > len(self.buffer):
+            raise EOFError("Unexpected end of buffer while reading {} array".format(fmt))
+        data = numpy.frombuffer(self.buffer, dtype=dtype, count=size, offset=self.offset)
+        self.offset += data.nbytes
+        return data.reshape(shape).copy()
+
+
+@contextmanager
+def map_file(filename):
+    """
+    Map the file at the given filename read-only for a BinaryBufferReader
+    Only the pages that are read are loaded, so chunks that are skipped with seek are never read from disk.
+    Arrays read from the mapping are copies, so nothing refers to it once the with block ends.
+    :param filename: The location of the file on the system
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            yield mapping
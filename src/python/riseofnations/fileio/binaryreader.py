@@ -1,4 +1,5 @@
-import struct
+import numpy
+from .binarystructs import array_dtype, get_struct, get_structs
 
 
 class BinaryReader:
@@ -10,53 +11,87 @@ class BinaryReader:
         """
         self.file = binaryfile
         self.byteorder = byteorder
+        self._structs = get_structs(byteorder)
+
+    def unpack(self, fmt):
+        """
+        Read the values of a struct format, the byte order is prepended to fmt
+        """
+        return self._unpack(get_struct(self.byteorder + fmt))
+
+    def _unpack(self, s):
+        data = self.file.read(s.size)
+        if len(data) != s.size:
+            raise EOFError("Unexpected end of file while reading {}".format(s.format))
+        return s.unpack(data)
+
+    def read_bytes(self, count):
+        return self.file.read(count)
+
+    def seek(self, offset, whence=0):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def read_array(self, fmt, count):
+        """
+        Read an array of a single struct format character
+        :param fmt: struct format character such as 'f' or 'H'
+        :param count: number of elements, or the shape of the returned array
+        :return: writable numpy array
+        """
+        data = numpy.empty(count, dtype=array_dtype(self.byteorder, fmt))
+        if self.file.readinto(data) != data.nbytes:
+            raise EOFError("Unexpected end of file while reading {} array".format(fmt))
+        return data
 
     def read_char(self):
-        data = struct.unpack('c', self.file.read(1))[0]
+        data = self._unpack(self._structs.char)[0]
         return data
 
     def read_byte(self):
-        data = struct.unpack('b', self.file.read(1))[0]
+        data = self._unpack(self._structs.byte)[0]
         return data
 
     def read_ubyte(self):
-        data = struct.unpack('B', self.file.read(1))[0]
+        data = self._unpack(self._structs.ubyte)[0]
         return data
 
     def read_bool(self):
-        data = struct.unpack('?', self.file.read(1))[0]
+        data = self._unpack(self._structs.bool)[0]
         return data
 
     def read_int16(self):
-        data = struct.unpack(self.byteorder + 'h', self.file.read(2))[0]
+        data = self._unpack(self._structs.int16)[0]
         return data
 
     def read_uint16(self):
-        data = struct.unpack(self.byteorder + 'H', self.file.read(2))[0]
+        data = self._unpack(self._structs.uint16)[0]
         return data
 
     def read_int32(self):
-        data = struct.unpack(self.byteorder + 'l', self.file.read(4))[0]
+        data = self._unpack(self._structs.int32)[0]
         return data
 
     def read_uint32(self):
-        data = struct.unpack(self.byteorder + 'L', self.file.read(4))[0]
+        data = self._unpack(self._structs.uint32)[0]
         return data
 
     def read_int64(self):
-        data = struct.unpack(self.byteorder + 'q', self.file.read(8))[0]
+        data = self._unpack(self._structs.int64)[0]
         return data
 
     def read_uint64(self):
-        data = struct.unpack(self.byteorder + 'Q', self.file.read(8))[0]
+        data = self._unpack(self._structs.uint64)[0]
         return data
 
     def read_float(self):
-        data = struct.unpack(self.byteorder + 'f', self.file.read(4))[0]
+        data = self._unpack(self._structs.float)[0]
         return data
 
     def read_double(self):
-        data = struct.unpack(self.byteorder + 'd', self.file.read(8))[0]
+        data = self._unpack(self._structs.double)[0]
         return data
 
     # def read_string(self):
@@ -68,5 +103,5 @@ class BinaryReader:
     #     return str.decode('utf-8', 'strict')
 
     def read_string(self, bytecount, encoding='utf-8', errors='strict'):
-        data = self.file.read(bytecount).decode(encoding, errors)
+        data = self.read_bytes(bytecount).decode(encoding, errors)
         return data
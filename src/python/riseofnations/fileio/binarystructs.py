@@ -0,0 +1,45 @@
+import functools
+import struct
+
+# numpy dtypes matching the standard sizes of the struct format characters
+array_dtypes = {
+    'b': 'i1', 'B': 'u1', '?': '?',
+    'h': 'i2', 'H': 'u2',
+    'i': 'i4', 'I': 'u4', 'l': 'i4', 'L': 'u4',
+    'q': 'i8', 'Q': 'u8',
+    'f': 'f4', 'd': 'f8',
+}
+
+
+class BinaryStructs:
+    def __init__(self, byteorder):
+        """
+        Precompiled structs for the scalar types of BinaryReader and BinaryWriter
+        :param byteorder: use '<' for little-endian, and '>' for big-endian
+        """
+        self.char = struct.Struct(byteorder + 'c')
+        self.byte = struct.Struct(byteorder + 'b')
+        self.ubyte = struct.Struct(byteorder + 'B')
+        self.bool = struct.Struct(byteorder + '?')
+        self.int16 = struct.Struct(byteorder + 'h')
+        self.uint16 = struct.Struct(byteorder + 'H')
+        self.int32 = struct.Struct(byteorder + 'l')
+        self.uint32 = struct.Struct(byteorder + 'L')
+        self.int64 = struct.Struct(byteorder + 'q')
+        self.uint64 = struct.Struct(byteorder + 'Q')
+        self.float = struct.Struct(byteorder + 'f')
+        self.double = struct.Struct(byteorder + 'd')
+
+
+@functools.lru_cache(maxsize=None)
+def get_structs(byteorder):
+    return BinaryStructs(byteorder)
+
+
+@functools.lru_cache(maxsize=None)
+def get_struct(fmt):
+    return struct.Struct(fmt)
+
+
+def array_dtype(byteorder, fmt):
+    return byteorder + array_dtypes[fmt]
@@ -1,4 +1,5 @@
-import struct
+import numpy
+from .binarystructs import array_dtype, get_struct, get_structs
 
 
 class BinaryWriter:
@@ -10,42 +11,66 @@ class BinaryWriter:
         """
         self.file = binaryfile
         self.byteorder = byteorder
+        self._structs = get_structs(byteorder)
+
+    def pack(self, fmt, *data):
+        """
+        Write the values of a struct format, the byte order is prepended to fmt
+        """
+        self.file.write(get_struct(self.byteorder + fmt).pack(*data))
+
+    def write_bytes(self, data):
+        self.file.write(data)
+
+    def seek(self, offset, whence=0):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def write_array(self, data, fmt):
+        """
+        Write an array of a single struct format character
+        :param data: numpy array, array.array, or any nested sequence numpy can convert
+        :param fmt: struct format character such as 'f' or 'H'
+        """
+        self.file.write(numpy.ascontiguousarray(data, dtype=array_dtype(self.byteorder, fmt)))
 
     def write_char(self, data):
-        self.file.write(struct.pack('c', data))
+        self.file.write(self._structs.char.pack(data))
 
     def write_byte(self, data):
-        self.file.write(struct.pack('b', data))
+        self.file.write(self._structs.byte.pack(data))
 
     def write_ubyte(self, data):
-        self.file.write(struct.pack('B', data))
+        self.file.write(self._structs.ubyte.pack(data))
 
     def write_bool(self, data):
-        self.file.write(struct.pack('?', data))
+        self.file.write(self._structs.bool.pack(data))
 
     def write_int16(self, data):
-        self.file.write(struct.pack(self.byteorder + 'h', data))
+        self.file.write(self._structs.int16.pack(data))
 
     def write_uint16(self, data):
-        self.file.write(struct.pack(self.byteorder + 'H', data))
+        self.file.write(self._structs.uint16.pack(data))
 
     def write_int32(self, data):
-        self.file.write(struct.pack(self.byteorder + 'l', data))
+        self.file.write(self._structs.int32.pack(data))
 
     def write_uint32(self, data):
-        self.file.write(struct.pack(self.byteorder + 'L', data))
+        self.file.write(self._structs.uint32.pack(data))
 
     def write_int64(self, data):
-        self.file.write(struct.pack(self.byteorder + 'q', data))
+        self.file.write(self._structs.int64.pack(data))
 
     def write_uint64(self, data):
-        self.file.write(struct.pack(self.byteorder + 'Q', data))
+        self.file.write(self._structs.uint64.pack(data))
 
     def write_float(self, data):
-        self.file.write(struct.pack(self.byteorder + 'f', data))
+        self.file.write(self._structs.float.pack(data))
 
     def write_double(self, data):
-        self.file.write(struct.pack(self.byteorder + 'd', data))
+        self.file.write(self._structs.double.pack(data))
 
     def write_string(self, data, encoding='utf-8', errors='strict'):
         self.file.write(data.encode(encoding, errors))
@@ -1,5 +1,12 @@
 from ...fileio.binaryreader import BinaryReader
+from ...fileio.binarybufferreader import BinaryBufferReader
 import struct
+import numpy
+
+_vector3 = struct.Struct('<fff')
+_quaternion = struct.Struct('<ffff')
+_uv = struct.Struct('<ff')
+_face = struct.Struct('<HHH')
 
 
 class BH3BinaryReader(BinaryReader):
@@ -8,22 +15,53 @@ class BH3BinaryReader(BinaryReader):
 
     def read_string(self):
         str_length = self.read_uint32() - 1
-        data = self.file.read(str_length).decode('utf-8', 'strict')
-        self.file.seek(1, 1)
+        data = self.read_bytes(str_length).decode('utf-8', 'strict')
+        self.seek(1, 1)
         return data
 
     def read_vector3(self):
-        data = list(struct.unpack(self.byteorder + 'fff', self.file.read(12)))
+        data = list(self._unpack(_vector3))
         return data
 
     def read_quaternion(self):
-        x, y, z, w = struct.unpack(self.byteorder + 'ffff', self.file.read(16))
+        x, y, z, w = self._unpack(_quaternion)
         return [w, x, y, z]
 
     def read_uv(self):
-        u, v = struct.unpack(self.byteorder + 'ff', self.file.read(8))
+        u, v = self._unpack(_uv)
         return [u, 1.0 - v]
 
     def read_face(self):
-        x, y, z = struct.unpack(self.byteorder + 'HHH', self.file.read(6))
+        x, y, z = self._unpack(_face)
         return [z, y, x]
+
+    def read_vector4_array(self, count):
+        """
+        Read count padded vectors, returned as an Nx3 view over the Nx4 data
+        """
+        return self.read_array('f', (count, 4))[:, :3]
+
+    def read_vector3_array(self, count):
+        return self.read_array('f', (count, 3))
+
+    def read_uv_array(self, count):
+        """
+        Read count uvs with V flipped, in double precision like read_uv so that write_uv_array restores the file's bits
+        """
+        data = self.read_array('f', (count, 2)).astype(numpy.float64)
+        data[:, 1] = 1.0 - data[:, 1]
+        return data
+
+    def read_face_array(self, count):
+        data = self.read_array('H', (count, 3))
+        return numpy.ascontiguousarray(data[:, ::-1])
+
+
+class BH3BinaryBufferReader(BH3BinaryReader, BinaryBufferReader):
+    def __init__(self, buffer, offset=0):
+        """
+        BH3BinaryReader over an in-memory buffer
+        :param buffer: bytes-like object such as bytes, bytearray, memoryview, or mmap
+        :param offset: byte offset in the buffer to start reading from
+        """
+        BinaryBufferReader.__init__(self, buffer, byteorder='<', offset=offset)
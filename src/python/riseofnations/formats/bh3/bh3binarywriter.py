@@ -1,5 +1,11 @@
 from ...fileio.binarywriter import BinaryWriter
 import struct
+import numpy
+
+_vector3 = struct.Struct('<fff')
+_quaternion = struct.Struct('<ffff')
+_uv = struct.Struct('<ff')
+_face = struct.Struct('<HHH')
 
 
 class BH3BinaryWriter(BinaryWriter):
@@ -8,18 +14,68 @@ class BH3BinaryWriter(BinaryWriter):
 
     def write_string(self, data):
         data = data.encode('utf-8', 'strict')
-        self.file.write(struct.pack(self.byteorder + 'L', len(data) + 1))
+        self.write_uint32(len(data) + 1)
         self.file.write(data)
-        self.file.write(struct.pack('B', 0))
+        self.write_ubyte(0)
 
     def write_vector3(self, data):
-        self.file.write(struct.pack(self.byteorder + 'fff', data[0], data[1], data[2]))
+        self.file.write(_vector3.pack(data[0], data[1], data[2]))
 
     def write_quaternion(self, data):
-        self.file.write(struct.pack(self.byteorder + 'ffff', data[1], data[2], data[3], data[0]))
+        self.file.write(_quaternion.pack(data[1], data[2], data[3], data[0]))
 
     def write_uv(self, data):
-        self.file.write(struct.pack(self.byteorder + 'ff', data[0], 1.0 - data[1]))
+        self.file.write(_uv.pack(data[0], 1.0 - data[1]))
 
     def write_face(self, data):
-        self.file.write(struct.pack(self.byteorder + 'HHH', data[2], data[1], data[0]))
+        self.file.write(_face.pack(data[2], data[1], data[0]))
+
+    def write_vector4_array(self, data, w):
+        """
+        Write Nx3 data as N vectors of four floats with w as the last component
+        """
+        vectors = numpy.asarray(data, dtype=numpy.float32).reshape(-1, 3)
+        padded = numpy.empty((len(vectors), 4), dtype=numpy.float32)
+        padded[:, :3] = vectors
+        padded[:, 3] = w
+        self.write_array(padded, 'f')
+
+    def write_vector3_array(self, data):
+        self.write_array(numpy.asarray(data, dtype=numpy.float32).reshape(-1, 3), 'f')
+
+    def write_uv_array(self, data):
+        # Flip in double precision so the result matches write_uv
+        uvs = numpy.array(data, dtype=numpy.float64).reshape(-1, 2)
+        uvs[:, 1] = 1.0 - uvs[:, 1]
+        self.write_array(uvs, 'f')
+
+    def write_face_array(self, data):
+        faces = numpy.asarray(data, dtype=numpy.uint16).reshape(-1, 3)
+        self.write_array(faces[:, ::-1], 'H')
+
+    def write_float_array(self, data):
+        self.write_array(data, 'f')
+
+    def begin_chunk(self, chunk_type, num_children):
+        """
+        Write a chunk header with a placeholder size, end_chunk fills it in
+        The file must be seekable.
+        :param chunk_type: The chunk type
+        :param num_children: The number of child chunks that follow the chunk's own data
+        :return: The offset of the chunk, to pass to end_chunk
+        """
+        offset = self.file.tell()
+        self.write_uint32(0)
+        self.write_uint16(chunk_type)
+        self.write_uint16(num_children)
+        return offset
+
+    def end_chunk(self, offset):
+        """
+        Back-patch the size of the chunk started at offset to cover everything written since
+        :param offset: The offset returned by begin_chunk
+        """
+        end = self.file.tell()
+        self.file.seek(offset)
+        self.write_uint32(end - offset)
+        self.file.seek(end)
@@ -1,4 +1,6 @@
 class BH3Bone:
+    __slots__ = ('vertex_index', 'vertex_count', 'name', 'rotation', 'position', 'parent', 'children')
+
     def __init__(self):
         self.vertex_index = -1
         self.vertex_count = 0
@@ -8,41 +10,42 @@ class BH3Bone:
         self.parent = None
         self.children = []
 
-        self._data_size = 0
-        self._total_data_size = 0
-
     def read(self, reader):
         self.vertex_index = reader.read_int32()
         self.vertex_count = reader.read_uint32()
         self.name = reader.read_string()
         self.rotation = reader.read_quaternion()
         self.position = reader.read_vector3()
-        reader.file.seek(4, 1)
-
-    def calc_size(self):
-        self._data_size = 53 + len(self.name.encode('utf-8', 'strict'))
-        self._total_data_size += self._data_size + 8
-
-        for child in self.children:
-            self._total_data_size += child.calc_size()
-
-        return self._total_data_size
+        reader.seek(4, 1)
 
     def write(self, writer):
-        writer.write_uint32(self._total_data_size)
-        writer.write_uint16(6)
-        writer.write_uint16(len(self.children) + 1)
-
-        writer.write_uint32(self._data_size)
-        writer.write_uint16(7)
-        writer.write_uint16(0)
-
+        """
+        Write this bone and all of its descendants, each bone as a container chunk
+        holding its data chunk followed by its children
+        The hierarchy is walked once without recursion, and the container sizes are back-patched.
+        :param writer: BH3BinaryWriter on a seekable file
+        """
+        stack = [(self, None)]
+        while stack:
+            bone, offset = stack.pop()
+            if offset is not None:
+                writer.end_chunk(offset)
+                continue
+
+            offset = writer.begin_chunk(6, len(bone.children) + 1)
+            stack.append((bone, offset))
+            bone.write_data(writer)
+            stack.extend((child, None) for child in reversed(bone.children))
+
+    def write_data(self, writer):
+        """
+        Write the data chunk of this bone only
+        """
+        offset = writer.begin_chunk(7, 0)
         writer.write_int32(self.vertex_index)
         writer.write_uint32(self.vertex_count)
         writer.write_string(self.name)
         writer.write_quaternion(self.rotation)
         writer.write_vector3(self.position)
         writer.write_float(self.rotation[1])
-
-        for child in self.children:
-            child.write(writer)
+        writer.end_chunk(offset)
@@ -1,6 +1,14 @@
-from .bh3binaryreader import BH3BinaryReader
+import io
+from .bh3binaryreader import BH3BinaryReader, BH3BinaryBufferReader
 from .bh3binarywriter import BH3BinaryWriter
 from .bh3bone import BH3Bone
+from ..chunk import scan_chunk_tree
+from ...fileio.binarybufferreader import map_file
+from ..parsecache import get_default_cache
+
+
+def _to_list(values):
+    return values.tolist() if hasattr(values, 'tolist') else values
 
 
 class BH3File:
@@ -11,41 +19,124 @@ class BH3File:
         self.faces = []
         self.root_bone = None
 
-        self._mesh_data_size = 0
-        self._file_size = 0
+        self._skip_chunk_types = ()
 
-    def read(self, filename):
+    @staticmethod
+    def read_index(filename):
         """
-        Read the file at the given filename
+        Read only the chunk headers of the file at the given filename
+        Bone data chunks (type 7) also get the bone name filled in, in the
+        same depth-first order that BHA files store their bone tracks.
         :param filename: The location of the file on the system
+        :return: the root Chunk, Chunk.walk() lists the whole table of contents
         """
         with open(filename, 'rb') as f:
+            root_chunk = scan_chunk_tree(f)
             reader = BH3BinaryReader(f)
-            self._read_chunk(reader)
+            for chunk in root_chunk.walk():
+                if chunk.chunk_type == 7:
+                    f.seek(chunk.data_offset + 8)
+                    chunk.name = reader.read_string()
+        return root_chunk
+
+    def read(self, filename, as_lists=False, mesh=True, skeleton=True, cache=None):
+        """
+        Read the file at the given filename
+        :param filename: The location of the file on the system
+        :param as_lists: convert the mesh arrays to nested lists after reading
+        :param mesh: read the mesh chunk, otherwise it is skipped
+        :param skeleton: read the bone chunks, otherwise they are skipped
+        :param cache: ParseCache to use, None for get_default_cache(), or False to disable.
+        Only full reads are cached.
+        """
+        self._skip_chunk_types = ()
+        if not mesh:
+            self._skip_chunk_types += (1,)
+        if not skeleton:
+            self._skip_chunk_types += (6,)
+
+        if cache is None:
+            cache = get_default_cache()
+        if not cache or self._skip_chunk_types:
+            with map_file(filename) as data:
+                self._read_chunk(BH3BinaryBufferReader(data))
+        else:
+            self._read_cached(filename, cache)
+
+        if as_lists:
+            # Arrays of chunks that were skipped or missing are still the empty default lists
+            self.vertices = _to_list(self.vertices)
+            self.normals = _to_list(self.normals)
+            self.uvs = _to_list(self.uvs)
+            self.faces = _to_list(self.faces)
+
+    def _read_cached(self, filename, cache):
+        key, entry = cache.lookup(filename)
+        if entry is None:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            key, entry = cache.lookup(filename, data)
+            if entry is None:
+                self._read_chunk(BH3BinaryBufferReader(data))
+                cache.store(key, filename, *self._create_cache_entry())
+                return
+
+        self.vertices = entry['vertices']
+        self.normals = entry['normals']
+        self.uvs = entry['uvs']
+        self.faces = entry['faces']
+
+        bones = []
+        for name, vertex_index, vertex_count, rotation, position, parent in entry['meta']['bones']:
+            bone = BH3Bone()
+            bone.name = name
+            bone.vertex_index = vertex_index
+            bone.vertex_count = vertex_count
+            bone.rotation = rotation
+            bone.position = position
+            if parent >= 0:
+                bone.parent = bones[parent]
+                bone.parent.children.append(bone)
+            bones.append(bone)
+        self.root_bone = bones[0] if bones else None
+
+    def _create_cache_entry(self):
+        bones = []
+        stack = [(self.root_bone, -1)] if self.root_bone else []
+        while stack:
+            bone, parent = stack.pop()
+            bones.append([bone.name, bone.vertex_index, bone.vertex_count,
+                          list(bone.rotation), list(bone.position), parent])
+            stack.extend((child, len(bones) - 1) for child in reversed(bone.children))
+
+        arrays = {
+            'vertices': self.vertices,
+            'normals': self.normals,
+            'uvs': self.uvs,
+            'faces': self.faces,
+        }
+        return arrays, {'bones': bones}
 
     def _read_chunk(self, reader, parent=None):
-        reader.read_uint32()  # data_size
+        data_size = reader.read_uint32()
         chunk_type = reader.read_uint16()
         num_children = reader.read_uint16()
 
-        if chunk_type == 2:  # vertices
+        if chunk_type in self._skip_chunk_types:
+            reader.seek(data_size - 8, 1)
+        elif chunk_type == 2:  # vertices
             num_elements = reader.read_uint32()
-            for vt in range(0, num_elements):
-                self.vertices.append(reader.read_vector3())
-                reader.file.seek(4, 1)
+            self.vertices = reader.read_vector4_array(num_elements)
         elif chunk_type == 3:  # normals
             num_elements = reader.read_uint32()
-            for ni in range(0, num_elements):
-                self.normals.append(reader.read_vector3())
-            reader.file.seek(4 * num_elements, 1)
+            self.normals = reader.read_vector3_array(num_elements)
+            reader.seek(4 * num_elements, 1)
         elif chunk_type == 4:  # uvs
             num_elements = reader.read_uint32()
-            for tv in range(0, num_elements):
-                self.uvs.append(reader.read_uv())
+            self.uvs = reader.read_uv_array(num_elements)
         elif chunk_type == 5:  # faces
             num_elements = int(reader.read_uint32() / 3)
-            for fa in range(0, num_elements):
-                self.faces.append(reader.read_face())
+            self.faces = reader.read_face_array(num_elements)
         elif chunk_type == 6:
             parent = self._read_chunk(reader, parent)
             num_children -= 1
@@ -63,52 +154,46 @@ class BH3File:
             for c in range(0, num_children):
                 self._read_chunk(reader)
 
-    def calc_size(self):
-        self._mesh_data_size = 56 + 40 * len(self.vertices) + 6 * len(self.faces)
-        self._file_size = 8 + self._mesh_data_size + self.root_bone.calc_size()
-
     def write(self, filename):
+        """
+        Write the file to the given filename
+        The file is serialized to memory first and written to disk in one call.
+        :param filename: The location of the file on the system
+        """
+        buffer = io.BytesIO()
+        writer = BH3BinaryWriter(buffer)
+
+        file_offset = writer.begin_chunk(0, 2)
+        mesh_offset = writer.begin_chunk(1, 4)
+
+        writer.write_uint32(12 + len(self.vertices) * 16)
+        writer.write_uint16(2)
+        writer.write_uint16(0)
+        writer.write_uint32(len(self.vertices))
+        writer.write_vector4_array(self.vertices, 1.0)
+
+        writer.write_uint32(12 + len(self.normals) * 16)
+        writer.write_uint16(3)
+        writer.write_uint16(0)
+        writer.write_uint32(len(self.normals))
+        writer.write_vector3_array(self.normals)
+        writer.write_bytes(b'\xff\xff\xff\xff' * len(self.normals))
+
+        writer.write_uint32(12 + len(self.uvs) * 8)
+        writer.write_uint16(4)
+        writer.write_uint16(0)
+        writer.write_uint32(len(self.uvs))
+        writer.write_uv_array(self.uvs)
+
+        writer.write_uint32(12 + len(self.faces) * 6)
+        writer.write_uint16(5)
+        writer.write_uint16(0)
+        writer.write_uint32(len(self.faces) * 3)
+        writer.write_face_array(self.faces)
+        writer.end_chunk(mesh_offset)
+
+        self.root_bone.write(writer)
+        writer.end_chunk(file_offset)
+
         with open(filename, 'wb') as f:
-            writer = BH3BinaryWriter(f)
-            self.calc_size()
-
-            writer.write_uint32(self._file_size)
-            writer.write_uint16(0)
-            writer.write_uint16(2)
-
-            writer.write_uint32(self._mesh_data_size)
-            writer.write_uint16(1)
-            writer.write_uint16(4)
-
-            writer.write_uint32(12 + len(self.vertices) * 16)
-            writer.write_uint16(2)
-            writer.write_uint16(0)
-            writer.write_uint32(len(self.vertices))
-            for vert in self.vertices:
-                writer.write_vector3(vert)
-                writer.write_float(1.0)
-
-            writer.write_uint32(12 + len(self.normals) * 16)
-            writer.write_uint16(3)
-            writer.write_uint16(0)
-            writer.write_uint32(len(self.normals))
-            for norm in self.normals:
-                writer.write_vector3(norm)
-            for ni in range(0, len(self.normals)):
-                writer.write_uint32(4294967295)
-
-            writer.write_uint32(12 + len(self.uvs) * 8)
-            writer.write_uint16(4)
-            writer.write_uint16(0)
-            writer.write_uint32(len(self.uvs))
-            for uv in self.uvs:
-                writer.write_uv(uv)
-
-            writer.write_uint32(12 + len(self.faces) * 6)
-            writer.write_uint16(5)
-            writer.write_uint16(0)
-            writer.write_uint32(len(self.faces) * 3)
-            for face in self.faces:
-                writer.write_face(face)
-
-            self.root_bone.write(writer)
+            f.write(buffer.getbuffer())
@@ -0,0 +1,171 @@
+import struct
+import numpy
+from ..mappedfile import MappedFile
+from .bh3binaryreader import BH3BinaryBufferReader
+from .bh3bone import BH3Bone
+
+# rotation as xyzw, position, and the rotation x again as padding
+_bone_transform = struct.Struct('<8f')
+
+
+class BH3MappedFile(MappedFile):
+    def __init__(self, filename, writable=False):
+        """
+        View of a BH3 file backed by a memory map
+        Only the chunk headers are read up front. The mesh arrays are views into
+        the mapping created on first access, and keep it alive after the file is closed.
+        :param filename: The location of the file on the system
+        :param writable: Map the file for writing so set_bone_transform can patch it in place
+        """
+        super().__init__(filename, writable)
+
+        self._chunks = {}
+        self._bone_chunk = None
+        self._find_chunks(self.root_chunk)
+
+        self._vertices = None
+        self._normals = None
+        self._uvs = None
+        self._faces = None
+        self._root_bone = None
+        self._bone_data_chunks = None
+
+    def _release_views(self):
+        self._vertices = None
+        self._normals = None
+        self._uvs = None
+        self._faces = None
+
+    def _find_chunks(self, chunk):
+        # Keep the first occurrence of each chunk type, like BH3File.read keeps the first root bone
+        for child in chunk.children:
+            if child.chunk_type == 6:
+                if self._bone_chunk is None:
+                    self._bone_chunk = child
+            elif child.chunk_type in (2, 3, 4, 5):
+                self._chunks.setdefault(child.chunk_type, child)
+            else:
+                self._find_chunks(child)
+
+    def _count(self, chunk_type):
+        chunk = self._chunks.get(chunk_type)
+        if chunk is None:
+            return 0
+        return struct.unpack_from('<L', self._buffer, chunk.data_offset)[0]
+
+    def _array(self, chunk_type, dtype, count, width):
+        if count == 0:
+            return numpy.empty((0, width), dtype=dtype)
+        offset = self._chunks[chunk_type].data_offset + 4
+        data = numpy.frombuffer(self._buffer, dtype=dtype, count=count * width, offset=offset)
+        return data.reshape(count, width)
+
+    @property
+    def vertex_count(self):
+        return self._count(2)
+
+    @property
+    def face_count(self):
+        return self._count(5) // 3
+
+    @property
+    def vertices(self):
+        if self._vertices is None:
+            self._vertices = self._array(2, '<f4', self._count(2), 4)[:, :3]
+        return self._vertices
+
+    @property
+    def normals(self):
+        if self._normals is None:
+            self._normals = self._array(3, '<f4', self._count(3), 3)
+        return self._normals
+
+    @property
+    def uvs(self):
+        # The V flip needs new memory, so this is the only array that is not a view
+        if self._uvs is None:
+            # Flipped in double precision, the same as BH3File.read
+            self._uvs = self._array(4, '<f4', self._count(4), 2).astype(numpy.float64)
+            self._uvs[:, 1] = 1.0 - self._uvs[:, 1]
+        return self._uvs
+
+    @property
+    def faces(self):
+        if self._faces is None:
+            self._faces = self._array(5, '<u2', self.face_count, 3)[:, ::-1]
+        return self._faces
+
+    @property
+    def root_bone(self):
+        if self._root_bone is None and self._bone_chunk is not None:
+            self._root_bone = self._read_bone(self._bone_chunk, None)
+        return self._root_bone
+
+    def _read_bone(self, chunk, parent):
+        bone = BH3Bone()
+        bone.read(BH3BinaryBufferReader(self._buffer, chunk.children[0].data_offset))
+
+        bone.parent = parent
+        for child in chunk.children[1:]:
+            bone.children.append(self._read_bone(child, bone))
+        return bone
+
+    @property
+    def bone_data_chunks(self):
+        """
+        The data chunk of every bone, depth-first like BH3File.read_index, with the bone names filled in
+        """
+        if self._bone_data_chunks is None:
+            self._bone_data_chunks = []
+            stack = [self._bone_chunk] if self._bone_chunk is not None else []
+            while stack:
+                chunk = stack.pop()
+                data_chunk = chunk.children[0]
+                data_chunk.name = BH3BinaryBufferReader(self._buffer, data_chunk.data_offset + 8).read_string()
+                self._bone_data_chunks.append(data_chunk)
+                stack.extend(reversed(chunk.children[1:]))
+        return self._bone_data_chunks
+
+    def find_bone(self, name):
+        """
+        :return: The depth-first index of the bone with the given name, or -1
+        """
+        for bi, chunk in enumerate(self.bone_data_chunks):
+            if chunk.name == name:
+                return bi
+        return -1
+
+    def set_bone_transform(self, bone, rotation=None, position=None):
+        """
+        Overwrite the rotation and/or position of one bone directly in the file
+        Only these fixed-size fields can be patched, anything that changes the size of the file is refused.
+        :param bone: The depth-first index of the bone, or its name
+        :param rotation: The new rotation as wxyz, or None to keep it
+        :param position: The new position as xyz, or None to keep it
+        """
+        if not self._writable:
+            raise ValueError("{} was not opened as writable".format(self.filename))
+        if isinstance(bone, str):
+            index = self.find_bone(bone)
+            if index < 0:
+                raise KeyError(bone)
+            bone = index
+
+        chunk = self.bone_data_chunks[bone]
+        name_size = struct.unpack_from('<L', self._buffer, chunk.data_offset + 8)[0]
+        offset = chunk.data_offset + 12 + name_size
+        if offset + _bone_transform.size > chunk.offset + chunk.data_size:
+            raise ValueError("bone {} has no room for a transform".format(chunk.name))
+
+        values = list(_bone_transform.unpack_from(self._buffer, offset))
+        if rotation is not None:
+            if len(rotation) != 4:
+                raise ValueError("a rotation has 4 values, got {}".format(len(rotation)))
+            values[0:4] = rotation[1], rotation[2], rotation[3], rotation[0]
+            values[7] = rotation[1]
+        if position is not None:
+            if len(position) != 3:
+                raise ValueError("a position has 3 values, got {}".format(len(position)))
+            values[4:7] = position
+        _bone_transform.pack_into(self._buffer, offset, *values)
+        self._root_bone = None
@@ -0,0 +1,221 @@
+from collections import deque
+import numpy
+
+# Vertex scoring of Tom Forsyth's "Linear-Speed Vertex Cache Optimisation"
+_CACHE_DECAY_POWER = 1.5
+_LAST_TRIANGLE_SCORE = 0.75
+_VALENCE_BOOST_SCALE = 2.0
+_VALENCE_BOOST_POWER = 0.5
+_MAX_SCORED_VALENCE = 32
+
+
+def average_cache_miss_ratio(faces, cache_size=32):
+    """
+    Simulate a FIFO post-transform vertex cache over the faces
+    :param faces: Fx3 vertex indices
+    :param cache_size: number of vertices the cache holds
+    :return: the average number of cache misses per triangle, between 0.5 at best and 3.0 at worst
+    """
+    faces = numpy.asarray(faces).reshape(-1, 3)
+    if len(faces) == 0:
+        return 0.0
+
+    cache = deque()
+    cached = set()
+    misses = 0
+    for vi in faces.ravel().tolist():
+        if vi not in cached:
+            misses += 1
+            cache.append(vi)
+            cached.add(vi)
+            if len(cache) > cache_size:
+                cached.discard(cache.popleft())
+    return misses / len(faces)
+
+
+def _score_table(cache_size):
+    """
+    :return: table of vertex scores indexed by [cache position + 1][remaining triangles]
+    """
+    table = []
+    for position in range(-1, cache_size + 3):
+        if position < 0:
+            cache_score = 0.0
+        elif position < 3:
+            cache_score = _LAST_TRIANGLE_SCORE
+        else:
+            cache_score = max(1.0 - (position - 3) / max(cache_size - 3, 1), 0.0) ** _CACHE_DECAY_POWER
+        row = [-1.0]
+        for remaining in range(1, _MAX_SCORED_VALENCE + 1):
+            row.append(cache_score + _VALENCE_BOOST_SCALE * remaining ** -_VALENCE_BOOST_POWER)
+        table.append(row)
+    return table
+
+
+def optimize_vertex_cache(faces, vertex_count, cache_size=32):
+    """
+    Reorder the faces so that consecutive triangles reuse recently transformed vertices
+    Uses Forsyth's greedy algorithm against a simulated LRU cache. Triangles keep their own vertex order,
+    so their winding is unchanged.
+    :param faces: Fx3 vertex indices
+    :param vertex_count: number of vertices the faces index
+    :param cache_size: number of vertices the cache holds
+    :return: the reordered Fx3 faces
+    """
+    faces = numpy.asarray(faces, dtype=numpy.int64).reshape(-1, 3)
+    face_count = len(faces)
+    if face_count == 0:
+        return faces.copy()
+
+    flat = faces.ravel()
+    valences = numpy.bincount(flat, minlength=vertex_count)
+    offsets = numpy.cumsum(valences)[:-1]
+    vertex_faces = [block.tolist() for block in numpy.split(numpy.argsort(flat, kind='stable') // 3, offsets)]
+    remaining = valences.tolist()
+    face_vertices = faces.tolist()
+
+    scores = _score_table(cache_size)
+    cache_positions = [-1] * len(remaining)
+    vertex_scores = [scores[0][min(count, _MAX_SCORED_VALENCE)] for count in remaining]
+    face_scores = [vertex_scores[a] + vertex_scores[b] + vertex_scores[c] for a, b, c in face_vertices]
+    emitted = [False] * face_count
+
+    order = []
+    cache = []
+    best_face = max(range(0, face_count), key=face_scores.__getitem__)
+    next_unemitted = 0
+    while True:
+        order.append(best_face)
+        emitted[best_face] = True
+        triangle = face_vertices[best_face]
+        for vi in triangle:
+            remaining[vi] -= 1
+            vertex_faces[vi].remove(best_face)
+
+        cache = triangle + [vi for vi in cache if vi not in triangle]
+        for vi in cache[cache_size:]:
+            cache_positions[vi] = -1
+        for position, vi in enumerate(cache[:cache_size]):
+            cache_positions[vi] = position
+        for vi in cache:
+            vertex_scores[vi] = scores[cache_positions[vi] + 1][min(remaining[vi], _MAX_SCORED_VALENCE)]
+
+        best_face = -1
+        best_score = -1.0
+        for vi in cache:
+            for fi in vertex_faces[vi]:
+                a, b, c = face_vertices[fi]
+                score = vertex_scores[a] + vertex_scores[b] + vertex_scores[c]
+                face_scores[fi] = score
+                if score > best_score:
+                    best_face = fi
+                    best_score = score
+        del cache[cache_size:]
+
+        if best_face < 0:
+            # Dead end, nothing in the cache has triangles left, so continue with the next unemitted one
+            while next_unemitted < face_count and emitted[next_unemitted]:
+                next_unemitted += 1
+            if next_unemitted == face_count:
+                break
+            best_face = next_unemitted
+
+    return faces[order]
+
+
+def _vertex_blocks(file, vertex_count):
+    """
+    :return: for each vertex, the first index of the bone block holding it, or its own index if no bone holds it
+    """
+    blocks = numpy.arange(vertex_count, dtype=numpy.int64)
+    stack = [file.root_bone] if file.root_bone else []
+    while stack:
+        bone = stack.pop()
+        if bone.vertex_count > 0:
+            blocks[bone.vertex_index:bone.vertex_index + bone.vertex_count] = bone.vertex_index
+        stack.extend(bone.children)
+    return blocks
+
+
+def weld_vertices(file):
+    """
+    Merge the vertices of the same bone block whose position, normal, and uv are bit-identical
+    Vertices keep the order of their first copy, so every bone block stays contiguous, and the bones'
+    vertex ranges and the faces are updated to match.
+    :param file: BH3File with array vertices, normals, uvs, and faces
+    :return: the number of vertices removed
+    """
+    vertices = numpy.asarray(file.vertices, dtype=numpy.float32).reshape(-1, 3)
+    normals = numpy.asarray(file.normals, dtype=numpy.float32).reshape(-1, 3)
+    uvs = numpy.asarray(file.uvs).reshape(-1, 2)
+    vertex_count = len(vertices)
+    if vertex_count == 0:
+        return 0
+
+    keys = numpy.column_stack((_vertex_blocks(file, vertex_count),
+                               numpy.ascontiguousarray(vertices).view(numpy.int32),
+                               numpy.ascontiguousarray(normals).view(numpy.int32),
+                               numpy.ascontiguousarray(uvs, dtype=numpy.float64).view(numpy.int64)))
+    _, first_vertices, vertex_keys = numpy.unique(keys, axis=0, return_index=True, return_inverse=True)
+    if len(first_vertices) == vertex_count:
+        return 0
+
+    kept = numpy.sort(first_vertices)
+    key_indices = numpy.empty(len(first_vertices), dtype=numpy.int64)
+    key_indices[numpy.argsort(first_vertices)] = numpy.arange(len(first_vertices))
+    remap = key_indices[vertex_keys.reshape(-1)]
+
+    file.vertices = vertices[kept]
+    file.normals = normals[kept]
+    file.uvs = uvs[kept]
+    file.faces = remap[numpy.asarray(file.faces, dtype=numpy.int64).reshape(-1, 3)]
+
+    stack = [file.root_bone] if file.root_bone else []
+    while stack:
+        bone = stack.pop()
+        if bone.vertex_count > 0:
+            start = int(numpy.searchsorted(kept, bone.vertex_index))
+            bone.vertex_count = int(numpy.searchsorted(kept, bone.vertex_index + bone.vertex_count)) - start
+            bone.vertex_index = start
+        stack.extend(bone.children)
+    return vertex_count - len(kept)
+
+
+def reorder_vertices(file):
+    """
+    Order the vertices of each bone block by their first use in the faces, unused vertices last
+    Bone blocks keep their place, so the bones' vertex ranges are unchanged.
+    :param file: BH3File with array vertices, normals, uvs, and faces
+    """
+    vertex_count = len(file.vertices)
+    faces = numpy.asarray(file.faces, dtype=numpy.int64).reshape(-1, 3)
+    first_use = numpy.full(vertex_count, faces.size, dtype=numpy.int64)
+    flat = faces.ravel()
+    numpy.minimum.at(first_use, flat, numpy.arange(flat.size))
+
+    order = numpy.lexsort((numpy.arange(vertex_count), first_use, _vertex_blocks(file, vertex_count)))
+    remap = numpy.empty(vertex_count, dtype=numpy.int64)
+    remap[order] = numpy.arange(vertex_count)
+
+    file.vertices = numpy.asarray(file.vertices, dtype=numpy.float32).reshape(-1, 3)[order]
+    file.normals = numpy.asarray(file.normals, dtype=numpy.float32).reshape(-1, 3)[order]
+    file.uvs = numpy.asarray(file.uvs).reshape(-1, 2)[order]
+    file.faces = remap[faces]
+
+
+def optimize_mesh(file, weld=True, cache_size=32):
+    """
+    Weld duplicate vertices, reorder the faces for the post-transform vertex cache,
+    and then reorder the vertices within each bone block for fetch locality
+    :param file: BH3File with array vertices, normals, uvs, and faces
+    :param weld: merge bit-identical vertices of the same bone first
+    :param cache_size: number of vertices the simulated cache holds
+    :return: (vertices before, vertices after, ACMR before, ACMR after)
+    """
+    vertices_before = len(file.vertices)
+    acmr_before = average_cache_miss_ratio(file.faces, cache_size)
+    if weld:
+        weld_vertices(file)
+    file.faces = optimize_vertex_cache(file.faces, len(file.vertices), cache_size)
+    reorder_vertices(file)
+    return vertices_before, len(file.vertices), acmr_before, average_cache_miss_ratio(file.faces, cache_size)
@@ -1,53 +1,193 @@
-from .bhabonetrackkey import BHABoneTrackKey
+import numpy
+from .bhabonetrackkey import BHABoneTrackKey, create_key_data, key_data_from_records, key_record_dtype
+
+
+# Shared by all tracks without keys, key_data is only ever replaced, never resized in place
+_no_key_data = create_key_data(0)
+_no_key_data.flags.writeable = False
 
 
 class BHABoneTrack:
+    __slots__ = ('parent', 'children', '_key_data', '_keys', '_keys_changed')
+
     def __init__(self):
-        self.keys = []
         self.parent = None
         self.children = []
-        self._data_size = 0
-        self._total_data_size = 0
+        self._key_data = _no_key_data
+        self._keys = None
+        self._keys_changed = False
 
-    def read(self, reader):
-        num_elements = reader.read_uint32()
+    @property
+    def key_data(self):
+        """
+        Structured array of the keys with time_step, rotation (wxyz), and position fields
+        """
+        if self._keys_changed:
+            self._store_keys()
+        return self._key_data
 
-        for ki in range(0, num_elements):
-            bone_track_key = BHABoneTrackKey()
-            bone_track_key.time_step = reader.read_float()
-            bone_track_key.rotation = reader.read_quaternion()
-            bone_track_key.position = reader.read_vector3()
-            reader.file.seek(4, 1)
-            self.keys.append(bone_track_key)
+    @key_data.setter
+    def key_data(self, value):
+        self._key_data = value
+        self._keys = None
+        self._keys_changed = False
 
-    def calc_size(self):
-        self._data_size = 12 + 36 * len(self.keys)
-        self._total_data_size += self._data_size + 8
+    @property
+    def keys(self):
+        """
+        List of BHABoneTrackKey views into key_data, created on first access
+        Changing the list, such as appending or removing keys, rebuilds key_data to match
+        the next time key_data is used.
+        """
+        if self._keys is None:
+            self._keys = BHABoneTrackKeys(self, [BHABoneTrackKey(self._key_data, ki)
+                                                 for ki in range(len(self._key_data))])
+        return self._keys
 
-        for child in self.children:
-            self._total_data_size += child.calc_size()
+    @keys.setter
+    def keys(self, keys):
+        self._keys = BHABoneTrackKeys(self, keys)
+        self._keys_changed = True
 
-        return self._total_data_size
+    def read(self, reader):
+        num_elements = reader.read_uint32()
+        records = numpy.frombuffer(reader.read_bytes(key_record_dtype.itemsize * num_elements),
+                                   dtype=key_record_dtype, count=num_elements)
+        self.key_data = key_data_from_records(records)
 
     def write(self, writer):
-        writer.write_uint32(self._total_data_size)
-        writer.write_uint16(8)
-        writer.write_uint16(len(self.children) + 1)
+        """
+        Write this track and all of its descendants, each track as a container chunk
+        holding its key chunk followed by its children
+        The hierarchy is walked once without recursion, and the container sizes are back-patched.
+        :param writer: BH3BinaryWriter on a seekable file
+        """
+        stack = [(self, None)]
+        while stack:
+            bone_track, offset = stack.pop()
+            if offset is not None:
+                writer.end_chunk(offset)
+                continue
 
-        writer.write_uint32(self._data_size)
-        writer.write_uint16(7)
-        writer.write_uint16(0)
-        writer.write_uint32(len(self.keys))
+            offset = writer.begin_chunk(8, len(bone_track.children) + 1)
+            stack.append((bone_track, offset))
+            bone_track.write_keys(writer)
+            stack.extend((child, None) for child in reversed(bone_track.children))
 
-        for bone_track_key in self.keys:
-            writer.write_float(bone_track_key.time_step)
-            writer.write_quaternion(bone_track_key.rotation)
-            writer.write_vector3(bone_track_key.position)
-            writer.write_float(bone_track_key.rotation[1])
+    def write_keys(self, writer):
+        """
+        Write the key chunk of this track only
+        """
+        key_data = self.key_data
+        offset = writer.begin_chunk(7, 0)
+        writer.write_uint32(len(key_data))
 
-        for child in self.children:
-            child.write(writer)
+        # time step, rotation as xyzw, position, and the rotation x again as padding
+        rotation = key_data['rotation']
+        records = numpy.empty((len(key_data), 9), dtype=numpy.float32)
+        records[:, 0] = key_data['time_step']
+        records[:, 1:5] = rotation[:, [1, 2, 3, 0]]
+        records[:, 5:8] = key_data['position']
+        records[:, 8] = rotation[:, 1]
+        writer.write_float_array(records)
+        writer.end_chunk(offset)
 
     def add_keys(self, count):
-        for ki in range(count):
-            self.keys.append(BHABoneTrackKey())
+        """
+        Append count identity keys, keys taken from the track before stay views of it
+        """
+        key_data = numpy.concatenate((self.key_data, create_key_data(count)))
+        self._key_data = key_data
+        if self._keys is not None:
+            for key in self._keys:
+                key._key_data = key_data
+            list.extend(self._keys, [BHABoneTrackKey(key_data, ki) for ki in range(len(self._keys), len(key_data))])
+
+    def _store_keys(self):
+        """
+        Replace key_data with the values of the keys list and make each key a view into it
+        A key that appears more than once gets a new view for its later places.
+        """
+        keys = self._keys
+        key_data = create_key_data(len(keys))
+        for ki, key in enumerate(keys):
+            key_data[ki] = (key.time_step, tuple(key.rotation), tuple(key.position))
+
+        views = []
+        seen = set()
+        for ki, key in enumerate(keys):
+            if id(key) in seen:
+                key = BHABoneTrackKey(key_data, ki)
+            else:
+                seen.add(id(key))
+                key._key_data = key_data
+                key._index = ki
+            views.append(key)
+        list.__setitem__(keys, slice(None), views)
+        self._key_data = key_data
+        self._keys_changed = False
+
+
+class BHABoneTrackKeys(list):
+    """
+    The keys list of a BHABoneTrack, changes to the list are stored in the track's key_data
+    Changes only mark the track, so that key_data is rebuilt once when it is next used.
+    """
+
+    def __init__(self, bone_track, keys):
+        super().__init__(keys)
+        self._bone_track = bone_track
+
+    def store(self):
+        self._bone_track._keys_changed = True
+
+    def append(self, key):
+        list.append(self, key)
+        self.store()
+
+    def extend(self, keys):
+        list.extend(self, keys)
+        self.store()
+
+    def insert(self, index, key):
+        list.insert(self, index, key)
+        self.store()
+
+    def remove(self, key):
+        list.remove(self, key)
+        self.store()
+
+    def pop(self, index=-1):
+        key = list.pop(self, index)
+        self.store()
+        return key
+
+    def clear(self):
+        list.clear(self)
+        self.store()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self.store()
+
+    def reverse(self):
+        list.reverse(self)
+        self.store()
+
+    def __setitem__(self, index, value):
+        list.__setitem__(self, index, value)
+        self.store()
+
+    def __delitem__(self, index):
+        list.__delitem__(self, index)
+        self.store()
+
+    def __iadd__(self, keys):
+        list.extend(self, keys)
+        self.store()
+        return self
+
+    def __imul__(self, count):
+        list.__imul__(self, count)
+        self.store()
+        return self
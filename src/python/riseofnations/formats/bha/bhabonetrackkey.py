@@ -1,5 +1,69 @@
+import numpy
+
+# In-memory layout of a key, rotations are stored as wxyz
+key_dtype = numpy.dtype([('time_step', numpy.float32),
+                         ('rotation', numpy.float32, (4,)),
+                         ('position', numpy.float32, (3,))])
+
+# On-disk layout of a key: time step, quaternion as xyzw, position, padding
+key_record_dtype = numpy.dtype([('time_step', '<f4'),
+                                ('rotation', '<f4', (4,)),
+                                ('position', '<f4', (3,)),
+                                ('padding', '<f4')])
+
+
+def create_key_data(count):
+    """
+    Create a key array holding count keys with an identity rotation
+    """
+    key_data = numpy.zeros(count, dtype=key_dtype)
+    key_data['rotation'][:, 0] = 1
+    return key_data
+
+
+def key_data_from_records(records):
+    """
+    Convert an array of on-disk key records to a key array
+    """
+    key_data = numpy.empty(len(records), dtype=key_dtype)
+    key_data['time_step'] = records['time_step']
+    key_data['rotation'] = records['rotation'][:, [3, 0, 1, 2]]
+    key_data['position'] = records['position']
+    return key_data
+
+
 class BHABoneTrackKey:
-    def __init__(self):
-        self.time_step = 0
-        self.rotation = [1, 0, 0, 0]
-        self.position = [0, 0, 0]
+    __slots__ = ('_key_data', '_index')
+
+    def __init__(self, key_data=None, index=0):
+        """
+        A single key, stored as a view of one element in a key array
+        :param key_data: key array holding this key, a new one is created if None
+        :param index: index of this key in key_data
+        """
+        self._key_data = key_data if key_data is not None else create_key_data(1)
+        self._index = index
+
+    @property
+    def time_step(self):
+        return float(self._key_data['time_step'][self._index])
+
+    @time_step.setter
+    def time_step(self, value):
+        self._key_data['time_step'][self._index] = value
+
+    @property
+    def rotation(self):
+        return self._key_data['rotation'][self._index]
+
+    @rotation.setter
+    def rotation(self, value):
+        self._key_data['rotation'][self._index] = tuple(value)
+
+    @property
+    def position(self):
+        return self._key_data['position'][self._index]
+
+    @position.setter
+    def position(self, value):
+        self._key_data['position'][self._index] = tuple(value)
@@ -1,51 +1,154 @@
-from ..bh3.bh3binaryreader import BH3BinaryReader
+import io
+import itertools
+import numpy
+from ..bh3.bh3binaryreader import BH3BinaryReader, BH3BinaryBufferReader
 from ..bh3.bh3binarywriter import BH3BinaryWriter
 from .bhabonetrack import BHABoneTrack
+from .bhabonetrackkey import create_key_data
+from ..chunk import scan_chunk_tree
+from ...fileio.binarybufferreader import map_file
+from ..parsecache import get_default_cache
 
 
 class BHAFile:
     def __init__(self):
         self.root_bone_track = None
-        self._file_size = 0
 
-    def read(self, filename):
+    @staticmethod
+    def read_index(filename):
+        """
+        Read only the chunk headers of the file at the given filename
+        :param filename: The location of the file on the system
+        :return: the root Chunk, Chunk.walk() lists the whole table of contents
+        """
+        with open(filename, 'rb') as f:
+            return scan_chunk_tree(f)
+
+    def read(self, filename, bone_tracks=None, cache=None):
+        """
+        Read the file at the given filename
+        :param filename: The location of the file on the system
+        :param bone_tracks: indexes of the bone tracks whose keys should be read, or None for all.
+        Tracks are numbered depth-first, matching the bone order of BH3File.read_index.
+        The keys of other tracks are skipped, but the tracks stay in the hierarchy.
+        :param cache: ParseCache to use, None for get_default_cache(), or False to disable.
+        Only full reads are cached.
+        """
+        if cache is None:
+            cache = get_default_cache()
+        if not cache or bone_tracks is not None:
+            with map_file(filename) as data:
+                self._read_tracks(BH3BinaryBufferReader(data), bone_tracks)
+        else:
+            self._read_cached(filename, cache)
+
+    def iter_bone_tracks(self, filename, bone_tracks=None):
+        """
+        Read the bone tracks of the file at the given filename one at a time
+        The file is read incrementally and no hierarchy is built, so memory use is
+        bounded by the largest track. root_bone_track is left untouched.
+        :param filename: The location of the file on the system
+        :param bone_tracks: indexes of the bone tracks whose keys should be read, or None for all.
+        Skipped tracks are still yielded, with no keys.
+        :return: generator of (bone_path, parent_index, key_data) in file (depth-first) order.
+        bone_path is the tuple of child positions leading from the root track to this one,
+        parent_index is the index of the parent track in the same order, or -1 for the root.
+        """
         with open(filename, 'rb') as f:
             reader = BH3BinaryReader(f)
-            self._read_chunk(reader)
+            for bone_path, parent_index, bone_track in self._iter_chunk(reader, bone_tracks, itertools.count(),
+                                                                        (), -1):
+                yield bone_path, parent_index, bone_track.key_data
+
+    def _read_cached(self, filename, cache):
+        key, entry = cache.lookup(filename)
+        if entry is None:
+            with open(filename, 'rb') as f:
+                data = f.read()
+            key, entry = cache.lookup(filename, data)
+            if entry is None:
+                self._read_tracks(BH3BinaryBufferReader(data), None)
+                cache.store(key, filename, *self._create_cache_entry())
+                return
+
+        key_data = entry['key_data']
+        tracks = []
+        start = 0
+        for parent, key_count in entry['meta']['tracks']:
+            bone_track = BHABoneTrack()
+            bone_track.key_data = key_data[start:start + key_count]
+            start += key_count
+            if parent >= 0:
+                bone_track.parent = tracks[parent]
+                bone_track.parent.children.append(bone_track)
+            tracks.append(bone_track)
+        self.root_bone_track = tracks[0] if tracks else None
+
+    def _create_cache_entry(self):
+        tracks = []
+        key_data = []
+        stack = [(self.root_bone_track, -1)] if self.root_bone_track else []
+        while stack:
+            bone_track, parent = stack.pop()
+            tracks.append([parent, len(bone_track.key_data)])
+            key_data.append(bone_track.key_data)
+            stack.extend((child, len(tracks) - 1) for child in reversed(bone_track.children))
+
+        key_data = numpy.concatenate(key_data) if key_data else create_key_data(0)
+        return {'key_data': key_data}, {'tracks': tracks}
 
-    def _read_chunk(self, reader, parent=None):
-        reader.file.seek(4, 1)  # data_size
+    def _read_tracks(self, reader, bone_tracks):
+        tracks = []
+        for bone_path, parent_index, bone_track in self._iter_chunk(reader, bone_tracks, itertools.count(), (), -1):
+            if parent_index >= 0:
+                bone_track.parent = tracks[parent_index]
+                bone_track.parent.children.append(bone_track)
+            tracks.append(bone_track)
+        self.root_bone_track = tracks[0] if tracks else None
+
+    def _iter_chunk(self, reader, bone_tracks, track_indices, bone_path, parent_index):
+        """
+        :param bone_tracks: indexes of the bone tracks whose keys should be read, or None for all
+        :param track_indices: iterator giving the depth-first index of each track as it is read
+        """
+        reader.read_uint32()  # data_size
         chunk_type = reader.read_uint16()
         num_children = reader.read_uint16()
 
         if chunk_type == 8:
-            parent = self._read_chunk(reader, parent)
+            track_index = next(track_indices)
+            read_keys = bone_tracks is None or track_index in bone_tracks
+            yield bone_path, parent_index, self._read_bone_track(reader, read_keys)
             num_children -= 1
             for bc in range(0, num_children):
-                self._read_chunk(reader, parent)
-            self.root_bone_track = parent
-        elif chunk_type == 7:
-            bone_track = BHABoneTrack()
-            bone_track.read(reader)
-            if parent:
-                bone_track.parent = parent
-                parent.children.append(bone_track)
-            return bone_track
+                yield from self._iter_chunk(reader, bone_tracks, track_indices, bone_path + (bc,), track_index)
         else:
             for c in range(0, num_children):
-                self._read_chunk(reader)
+                yield from self._iter_chunk(reader, bone_tracks, track_indices, bone_path, parent_index)
 
-    def calc_size(self):
-        self._file_size = 8 + self.root_bone_track.calc_size()
+    def _read_bone_track(self, reader, read_keys):
+        data_size = reader.read_uint32()
+        reader.seek(4, 1)  # chunk type 7 and num_children
 
-    def write(self, filename):
-        with open(filename, 'wb') as f:
-            writer = BH3BinaryWriter(f)
-            self.calc_size()
+        bone_track = BHABoneTrack()
+        if read_keys:
+            bone_track.read(reader)
+        else:
+            reader.seek(data_size - 8, 1)
+        return bone_track
 
-            writer.write_uint32(self._file_size)
-            writer.write_uint16(0)
-            writer.write_uint16(1)
+    def write(self, filename):
+        """
+        Write the file to the given filename
+        The file is serialized to memory first and written to disk in one call.
+        :param filename: The location of the file on the system
+        """
+        buffer = io.BytesIO()
+        writer = BH3BinaryWriter(buffer)
 
-            self.root_bone_track.write(writer)
+        file_offset = writer.begin_chunk(0, 1)
+        self.root_bone_track.write(writer)
+        writer.end_chunk(file_offset)
 
+        with open(filename, 'wb') as f:
+            f.write(buffer.getbuffer())
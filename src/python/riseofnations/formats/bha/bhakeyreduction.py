@@ -0,0 +1,76 @@
+import numpy
+from .. import quaternion
+
+
+def reduce_key_data(key_data, position_tolerance=0.001, rotation_tolerance=0.001):
+    """
+    Drop the keys that can be rebuilt by interpolating their neighbours within the given tolerances
+    Positions are interpolated linearly and rotations with slerp between the kept keys.
+    The first and last keys are always kept, and the time steps are recomputed for the kept keys.
+    :param key_data: key array of a bone track
+    :param position_tolerance: largest allowed distance between a dropped key and its interpolated position
+    :param rotation_tolerance: largest allowed angle in radians between a dropped key and its interpolated rotation
+    :return: a new key array holding the kept keys
+    """
+    count = len(key_data)
+    if count <= 2:
+        return key_data.copy()
+
+    times = numpy.cumsum(key_data['time_step'], dtype=numpy.float64)
+    positions = key_data['position'].astype(numpy.float64)
+    rotations = key_data['rotation'].astype(numpy.float64)
+
+    keep = numpy.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    segments = [(0, count - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+
+        span = times[end] - times[start]
+        inner = slice(start + 1, end)
+        if span > 0.0:
+            t = (times[inner] - times[start]) / span
+        else:
+            t = numpy.full(end - start - 1, 0.5)
+
+        position_error = numpy.linalg.norm(
+            positions[start] + (positions[end] - positions[start]) * t[:, numpy.newaxis] - positions[inner], axis=1)
+        rotation_error = quaternion.angle_between(
+            quaternion.slerp(rotations[start], rotations[end], t), rotations[inner])
+
+        # Split at the key that is furthest out of tolerance, relative to each tolerance
+        error = numpy.maximum(position_error / max(position_tolerance, 1.0e-12),
+                              rotation_error / max(rotation_tolerance, 1.0e-12))
+        worst = int(numpy.argmax(error))
+        if error[worst] > 1.0:
+            split = start + 1 + worst
+            keep[split] = True
+            segments.append((start, split))
+            segments.append((split, end))
+
+    reduced = key_data[keep].copy()
+    kept_times = times[keep]
+    reduced['time_step'] = numpy.diff(kept_times, prepend=0.0)
+    return reduced
+
+
+def reduce_bone_tracks(root_bone_track, position_tolerance=0.001, rotation_tolerance=0.001):
+    """
+    Reduce the keys of every track in a bone track hierarchy in place
+    :param root_bone_track: The root BHABoneTrack
+    :param position_tolerance: see reduce_key_data
+    :param rotation_tolerance: see reduce_key_data
+    :return: tuple of the key count before and after the reduction
+    """
+    keys_before = 0
+    keys_after = 0
+    stack = [root_bone_track]
+    while stack:
+        bone_track = stack.pop()
+        keys_before += len(bone_track.key_data)
+        bone_track.key_data = reduce_key_data(bone_track.key_data, position_tolerance, rotation_tolerance)
+        keys_after += len(bone_track.key_data)
+        stack.extend(bone_track.children)
+    return keys_before, keys_after
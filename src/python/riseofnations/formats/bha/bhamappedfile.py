@@ -0,0 +1,155 @@
+import struct
+import numpy
+from ..mappedfile import MappedFile
+from .bhabonetrackkey import BHABoneTrackKey, key_data_from_records, key_record_dtype
+
+
+class BHAMappedBoneTrack:
+    def __init__(self, buffer, chunk):
+        """
+        Bone track whose key data stays in the mapped file until accessed
+        :param buffer: memoryview of the mapped file
+        :param chunk: the type 7 chunk holding the keys of this track
+        """
+        self.parent = None
+        self.children = []
+        self.key_count = struct.unpack_from('<L', buffer, chunk.data_offset)[0]
+
+        self._buffer = buffer
+        self._key_offset = chunk.data_offset + 4
+        self._key_records = None
+        self._key_data = None
+        self._keys = None
+
+    @property
+    def key_records(self):
+        """
+        Structured array view of the on-disk key records, rotations are stored as xyzw
+        The view is read-only unless the file was opened as writable.
+        """
+        if self._key_records is None:
+            self._key_records = numpy.frombuffer(self._buffer, dtype=key_record_dtype,
+                                                 count=self.key_count, offset=self._key_offset)
+        return self._key_records
+
+    @property
+    def key_data(self):
+        """
+        Structured array of the keys in the same layout as BHABoneTrack.key_data
+        """
+        if self._key_data is None:
+            self._key_data = key_data_from_records(self.key_records)
+        return self._key_data
+
+    @property
+    def keys(self):
+        """
+        Tuple of BHABoneTrackKey views into key_data, use set_keys on the file to change keys
+        """
+        if self._keys is None:
+            self._keys = tuple(BHABoneTrackKey(self.key_data, ki) for ki in range(self.key_count))
+        return self._keys
+
+    def _release(self):
+        self._key_records = None
+        for child in self.children:
+            child._release()
+
+
+class BHAMappedFile(MappedFile):
+    def __init__(self, filename, writable=False):
+        """
+        View of a BHA file backed by a memory map
+        Only the chunk headers are read up front. Key record arrays are views into
+        the mapping, and keep it alive after the file is closed.
+        :param filename: The location of the file on the system
+        :param writable: Map the file for writing so set_keys can patch it in place
+        """
+        super().__init__(filename, writable)
+        self._root_bone_track = None
+        self._bone_tracks = None
+
+    def _release_views(self):
+        if self._root_bone_track is not None:
+            self._root_bone_track._release()
+
+    @property
+    def root_bone_track(self):
+        if self._root_bone_track is None:
+            track_chunk = self._find_track_chunk(self.root_chunk)
+            if track_chunk is not None:
+                self._root_bone_track = self._create_bone_track(track_chunk, None)
+        return self._root_bone_track
+
+    @property
+    def bone_tracks(self):
+        """
+        Every bone track, depth-first, matching the track numbering of BHAFile.read
+        """
+        if self._bone_tracks is None:
+            self._bone_tracks = []
+            stack = [self.root_bone_track] if self.root_bone_track is not None else []
+            while stack:
+                bone_track = stack.pop()
+                self._bone_tracks.append(bone_track)
+                stack.extend(reversed(bone_track.children))
+        return self._bone_tracks
+
+    def set_keys(self, track, keys=slice(None), time_step=None, rotation=None, position=None):
+        """
+        Overwrite key values of one track directly in the file
+        Only existing keys can be changed, anything that changes the number of keys is refused.
+        :param track: The depth-first index of the bone track
+        :param keys: Index, slice, or index array of the keys to change, all keys by default
+        :param time_step: New time steps, broadcast over the selected keys, or None to keep them
+        :param rotation: New rotations as wxyz, broadcast over the selected keys, or None to keep them
+        :param position: New positions as xyz, broadcast over the selected keys, or None to keep them
+        """
+        if not self._writable:
+            raise ValueError("{} was not opened as writable".format(self.filename))
+        bone_track = self.bone_tracks[track]
+        records = bone_track.key_records
+        selected = records[keys]
+
+        # Check every value before writing any of them
+        shape = numpy.shape(selected)
+        if time_step is not None:
+            time_step = self._broadcast(time_step, shape, 'time_step')
+        if rotation is not None:
+            rotation = self._broadcast(rotation, shape + (4,), 'rotation')
+        if position is not None:
+            position = self._broadcast(position, shape + (3,), 'position')
+
+        if time_step is not None:
+            records['time_step'][keys] = time_step
+        if rotation is not None:
+            records['rotation'][keys] = rotation[..., [1, 2, 3, 0]]
+            records['padding'][keys] = rotation[..., 1]
+        if position is not None:
+            records['position'][keys] = position
+        bone_track._key_data = None
+        bone_track._keys = None
+
+    @staticmethod
+    def _broadcast(value, shape, name):
+        try:
+            return numpy.broadcast_to(numpy.asarray(value, dtype=numpy.float32), shape)
+        except ValueError:
+            raise ValueError("{} of shape {} does not fit the {} selected keys".format(
+                name, numpy.shape(value), shape[0] if shape else 1)) from None
+
+    def _find_track_chunk(self, chunk):
+        for child in chunk.children:
+            if child.chunk_type == 8:
+                return child
+            track_chunk = self._find_track_chunk(child)
+            if track_chunk is not None:
+                return track_chunk
+        return None
+
+    def _create_bone_track(self, chunk, parent):
+        bone_track = BHAMappedBoneTrack(self._buffer, chunk.children[0])
+        bone_track.parent = parent
+        for child in chunk.children[1:]:
+            bone_track.children.append(self._create_bone_track(child, bone_track))
+        return bone_track
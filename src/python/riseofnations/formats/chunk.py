@@ -0,0 +1,75 @@
+import struct
+
+_chunk_header = struct.Struct('<LHH')
+
+
+class Chunk:
+    def __init__(self, offset, data_size, chunk_type, num_children):
+        """
+        Location of a chunk within a BH3/BHA buffer
+        :param offset: byte offset of the chunk header in the buffer
+        :param data_size: size stored in the header, including the header itself
+        :param chunk_type: type id stored in the header
+        :param num_children: number of child chunks stored in the header
+        """
+        self.offset = offset
+        self.data_size = data_size
+        self.chunk_type = chunk_type
+        self.num_children = num_children
+        self.name = None
+        self.children = []
+
+    def walk(self):
+        """
+        Iterate over this chunk and all of its descendants in file order
+        """
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    @property
+    def data_offset(self):
+        return self.offset + _chunk_header.size
+
+
+def read_chunk_tree(buffer, offset=0):
+    """
+    Walk the chunk headers in buffer without reading any chunk data
+    :param buffer: bytes-like object holding the whole file
+    :param offset: byte offset of the first chunk header
+    :return: the chunk at offset, with its children filled in
+    """
+    chunk, _ = _read_chunk(buffer, offset)
+    return chunk
+
+
+def scan_chunk_tree(file):
+    """
+    Walk the chunk headers of a file from its current position, seeking past all chunk data
+    :param file: binary file object positioned at a chunk header
+    :return: the chunk at the current position, with its children filled in
+    """
+    data_size, chunk_type, num_children = _chunk_header.unpack(file.read(_chunk_header.size))
+    chunk = Chunk(file.tell() - _chunk_header.size, data_size, chunk_type, num_children)
+
+    if num_children == 0:
+        file.seek(chunk.offset + data_size)
+        return chunk
+
+    for c in range(0, num_children):
+        chunk.children.append(scan_chunk_tree(file))
+    return chunk
+
+
+def _read_chunk(buffer, offset):
+    data_size, chunk_type, num_children = _chunk_header.unpack_from(buffer, offset)
+    chunk = Chunk(offset, data_size, chunk_type, num_children)
+
+    if num_children == 0:
+        return chunk, offset + data_size
+
+    end = chunk.data_offset
+    for c in range(0, num_children):
+        child, end = _read_chunk(buffer, end)
+        chunk.children.append(child)
+    return chunk, end
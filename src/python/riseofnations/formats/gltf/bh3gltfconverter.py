@@ -0,0 +1,282 @@
+import json
+import os
+import struct
+import numpy
+from .. import quaternion
+
+_glb_header = struct.Struct('<LLL')
+_glb_chunk_header = struct.Struct('<LL')
+_glb_magic = 0x46546C67
+_json_chunk_type = 0x4E4F534A
+_bin_chunk_type = 0x004E4942
+
+_array_buffer = 34962
+_element_array_buffer = 34963
+_component_types = {
+    numpy.dtype(numpy.int8): 5120,
+    numpy.dtype(numpy.uint8): 5121,
+    numpy.dtype(numpy.int16): 5122,
+    numpy.dtype(numpy.uint16): 5123,
+    numpy.dtype(numpy.uint32): 5125,
+    numpy.dtype(numpy.float32): 5126,
+}
+_accessor_types = {1: 'SCALAR', 2: 'VEC2', 3: 'VEC3', 4: 'VEC4', 16: 'MAT4'}
+_image_mime_types = {'.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg'}
+
+# Bh3 -- Left-handed X Left, Y Back, Z Up
+# glTF -- Right-handed X Left, Y Up, Z Forward
+# The root bone is rotated -90 degrees around X, so X = X, Y = Z, Z = -Y
+_root_rotation = numpy.array([numpy.sqrt(0.5), -numpy.sqrt(0.5), 0.0, 0.0])
+
+
+class BH3GltfConverter:
+    def __init__(self, mesh_name=None):
+        """
+        Converts a BH3 model and its BHA animations to binary glTF without Blender
+        :param mesh_name: name of the mesh, material, and mesh node; defaults to the output file name
+        """
+        self._mesh_name = mesh_name
+        self._views = []
+        self._accessors = []
+        self._data = []
+        self._length = 0
+
+    def save(self, filename, bh3_file, bha_files=None, texture_filename=None):
+        """
+        Write the mesh, skin, skeleton, and animations to a .glb file
+        :param filename: The location of the output file on the system
+        :param bh3_file: BH3File or BH3MappedFile with the model
+        :param bha_files: dict of animation name to BHAFile or BHAMappedFile
+        :param texture_filename: optional PNG or JPEG file to embed as the base color texture
+        """
+        mesh_name = self._mesh_name or os.path.splitext(os.path.basename(filename))[0]
+        gltf = self.convert(bh3_file, bha_files or {}, mesh_name, texture_filename)
+
+        json_data = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+        json_data += b' ' * (-len(json_data) % 4)
+        file_length = _glb_header.size + 2 * _glb_chunk_header.size + len(json_data) + self._length
+
+        with open(filename, 'wb') as f:
+            f.write(_glb_header.pack(_glb_magic, 2, file_length))
+            f.write(_glb_chunk_header.pack(len(json_data), _json_chunk_type))
+            f.write(json_data)
+            f.write(_glb_chunk_header.pack(self._length, _bin_chunk_type))
+            for data in self._data:
+                f.write(data)
+
+    def convert(self, bh3_file, bha_files, mesh_name, texture_filename=None):
+        """
+        Build the glTF document, the binary chunk data is kept until save writes it
+        :return: the glTF JSON as a dict
+        """
+        self._views = []
+        self._accessors = []
+        self._data = []
+        self._length = 0
+
+        bones, parents = self._flatten_bones(bh3_file.root_bone)
+        rotations = quaternion.inverse([bone.rotation for bone in bones])
+        translations = numpy.array([bone.position for bone in bones], dtype=numpy.float64)
+        rotations[0] = quaternion.multiply(_root_rotation, rotations[0])
+        translations[0] = quaternion.rotate(_root_rotation, translations[0])
+        world_matrices = self._world_matrices(rotations, translations, parents)
+
+        nodes = self._create_nodes(bones, parents, rotations, translations)
+        mesh_node = len(nodes)
+        nodes.append({'name': mesh_name, 'mesh': 0, 'skin': 0})
+
+        gltf = {
+            'asset': {'version': '2.0', 'generator': 'riseofnations'},
+            'scene': 0,
+            'scenes': [{'nodes': [0, mesh_node]}],
+            'nodes': nodes,
+            'meshes': [{'name': mesh_name,
+                        'primitives': [self._create_primitive(bh3_file, bones, world_matrices)]}],
+            'materials': [self._create_material(mesh_name)],
+            'skins': [{'joints': list(range(len(bones))),
+                       'skeleton': 0,
+                       'inverseBindMatrices': self._add_accessor(
+                           numpy.linalg.inv(world_matrices).transpose(0, 2, 1).reshape(-1, 16).astype(numpy.float32))}],
+        }
+
+        if texture_filename:
+            self._add_texture(gltf, texture_filename)
+
+        animations = []
+        for anim_name, bha_file in bha_files.items():
+            tracks = self._match_tracks(bh3_file.root_bone, bha_file.root_bone_track)
+            animation = self._create_animation(anim_name, tracks, rotations, translations)
+            if animation['channels']:
+                animations.append(animation)
+        if animations:
+            gltf['animations'] = animations
+
+        gltf['accessors'] = self._accessors
+        gltf['bufferViews'] = self._views
+        gltf['buffers'] = [{'byteLength': self._length}]
+        return gltf
+
+    def _flatten_bones(self, root_bone):
+        # Depth-first, which is also the order of the BHA tracks
+        bones = []
+        parents = []
+        stack = [(root_bone, -1)]
+        while stack:
+            bone, parent = stack.pop()
+            parents.append(parent)
+            index = len(bones)
+            bones.append(bone)
+            for child in reversed(bone.children):
+                stack.append((child, index))
+        return bones, parents
+
+    def _match_tracks(self, root_bone, root_bone_track):
+        # Pair tracks with bones by position in the hierarchy, like the Blender importer does
+        tracks = []
+        stack = [(root_bone, root_bone_track)]
+        while stack:
+            bone, track = stack.pop()
+            tracks.append(track)
+            track_children = track.children if track is not None else []
+            for ci in reversed(range(len(bone.children))):
+                stack.append((bone.children[ci], track_children[ci] if ci < len(track_children) else None))
+        return tracks
+
+    def _world_matrices(self, rotations, translations, parents):
+        local = numpy.zeros((len(parents), 4, 4))
+        local[:, :3, :3] = quaternion.to_matrix(rotations)
+        local[:, :3, 3] = translations
+        local[:, 3, 3] = 1.0
+
+        world = numpy.empty_like(local)
+        for bi, parent in enumerate(parents):
+            world[bi] = local[bi] if parent < 0 else world[parent] @ local[bi]
+        return world
+
+    def _create_nodes(self, bones, parents, rotations, translations):
+        nodes = []
+        names = set()
+        for bone, rotation, translation in zip(bones, rotations.tolist(), translations.tolist()):
+            name = bone.name
+            name_count = 1
+            while name in names:
+                name = bone.name + str(name_count)
+                name_count += 1
+            names.add(name)
+
+            w, x, y, z = rotation
+            nodes.append({'name': name, 'rotation': [x, y, z, w], 'translation': translation})
+
+        for bi, parent in enumerate(parents):
+            if parent >= 0:
+                nodes[parent].setdefault('children', []).append(bi)
+        return nodes
+
+    def _create_primitive(self, bh3_file, bones, world_matrices):
+        positions = numpy.array(bh3_file.vertices, dtype=numpy.float64).reshape(-1, 3)
+        normals = numpy.array(bh3_file.normals, dtype=numpy.float64).reshape(-1, 3)
+        joints = numpy.zeros((len(positions), 4), dtype=numpy.uint8 if len(bones) <= 256 else numpy.uint16)
+        weights = numpy.zeros((len(positions), 4), dtype=numpy.float32)
+        weights[:, 0] = 1.0
+
+        # Bone vertices are stored in the bone's space, move each contiguous block to the bind pose
+        for bi, bone in enumerate(bones):
+            block = slice(bone.vertex_index, bone.vertex_index + bone.vertex_count)
+            matrix = world_matrices[bi]
+            positions[block] = positions[block] @ matrix[:3, :3].T + matrix[:3, 3]
+            normals[block] = normals[block] @ numpy.linalg.inv(matrix[:3, :3])
+            joints[block, 0] = bi
+
+        # glTF uses the texture coordinates as stored in the file, undo the V flip of the reader
+        uvs = numpy.array(bh3_file.uvs, dtype=numpy.float64).reshape(-1, 2)
+        uvs[:, 1] = 1.0 - uvs[:, 1]
+        uvs = uvs.astype(numpy.float32)
+
+        # The reader reversed the file winding, which already matches glTF
+        faces = numpy.asarray(bh3_file.faces, dtype=numpy.uint16).reshape(-1)
+
+        return {
+            'attributes': {
+                'POSITION': self._add_accessor(positions.astype(numpy.float32), _array_buffer, True),
+                'NORMAL': self._add_accessor(normals.astype(numpy.float32), _array_buffer),
+                'TEXCOORD_0': self._add_accessor(uvs, _array_buffer),
+                'JOINTS_0': self._add_accessor(joints, _array_buffer),
+                'WEIGHTS_0': self._add_accessor(weights, _array_buffer),
+            },
+            'indices': self._add_accessor(faces, _element_array_buffer),
+            'material': 0,
+        }
+
+    def _create_material(self, name):
+        return {
+            'name': name,
+            'pbrMetallicRoughness': {
+                'baseColorFactor': [0.5, 0.5, 0.5, 1.0],
+                'metallicFactor': 0.1,
+                'roughnessFactor': 0.5,
+            },
+        }
+
+    def _add_texture(self, gltf, texture_filename):
+        extension = os.path.splitext(texture_filename)[1].lower()
+        if extension not in _image_mime_types:
+            raise ValueError("unsupported texture format {}, expected PNG or JPEG".format(extension))
+        mime_type = _image_mime_types[extension]
+        with open(texture_filename, 'rb') as f:
+            view = self._add_view(numpy.frombuffer(f.read(), dtype=numpy.uint8))
+
+        name = os.path.splitext(os.path.basename(texture_filename))[0]
+        gltf['images'] = [{'name': name, 'bufferView': view, 'mimeType': mime_type}]
+        gltf['textures'] = [{'name': name, 'source': 0}]
+        gltf['materials'][0]['pbrMetallicRoughness']['baseColorTexture'] = {'index': 0}
+
+    def _create_animation(self, anim_name, tracks, rotations, translations):
+        channels = []
+        samplers = []
+        for bi, track in enumerate(tracks):
+            if track is None or len(track.key_data) == 0:
+                continue
+
+            key_data = track.key_data
+            times = numpy.cumsum(key_data['time_step'], dtype=numpy.float64).astype(numpy.float32)
+            key_translations = quaternion.rotate(rotations[bi], key_data['position']) + translations[bi]
+            key_rotations = quaternion.multiply(rotations[bi], quaternion.inverse(key_data['rotation']))
+
+            time_accessor = self._add_accessor(times, min_max=True)
+            for path, values in (('rotation', key_rotations[:, [1, 2, 3, 0]]),
+                                 ('translation', key_translations)):
+                channels.append({'sampler': len(samplers), 'target': {'node': bi, 'path': path}})
+                samplers.append({'input': time_accessor,
+                                 'output': self._add_accessor(values.astype(numpy.float32)),
+                                 'interpolation': 'LINEAR'})
+
+        return {'name': anim_name, 'channels': channels, 'samplers': samplers}
+
+    def _add_view(self, data, target=None):
+        data = numpy.ascontiguousarray(data)
+        view = {'buffer': 0, 'byteOffset': self._length, 'byteLength': data.nbytes}
+        if target is not None:
+            view['target'] = target
+        self._views.append(view)
+
+        padding = -data.nbytes % 4
+        self._data.append(data)
+        if padding:
+            self._data.append(bytes(padding))
+        self._length += data.nbytes + padding
+        return len(self._views) - 1
+
+    def _add_accessor(self, data, target=None, min_max=False):
+        width = data.shape[1] if data.ndim > 1 else 1
+        accessor = {
+            'bufferView': self._add_view(data, target),
+            'componentType': _component_types[data.dtype],
+            'count': len(data),
+            'type': _accessor_types[width],
+        }
+        if min_max and len(data) > 0:
+            values = data.reshape(len(data), width)
+            accessor['min'] = values.min(axis=0).tolist()
+            accessor['max'] = values.max(axis=0).tolist()
+        self._accessors.append(accessor)
+        return len(self._accessors) - 1
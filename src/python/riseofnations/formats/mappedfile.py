@@ -0,0 +1,61 @@
+import mmap
+import os
+from .chunk import read_chunk_tree
+
+
+class MappedFile:
+    def __init__(self, filename, writable=False):
+        """
+        Base of the chunk files backed by a memory map
+        Only the chunk headers are read up front. Arrays handed out are views into
+        the mapping, and keep it alive after the file is closed.
+        :param filename: The location of the file on the system
+        :param writable: Map the file for writing so it can be patched in place
+        """
+        self.filename = filename
+        self._writable = writable
+        with open(filename, 'r+b' if writable else 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        self.root_chunk = read_chunk_tree(self._buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the file
+        Arrays taken from the file before closing stay valid, and the mapping
+        is only unmapped once the last of them is dropped.
+        """
+        if self._mmap is None:
+            return
+        self._release_views()
+        if self._writable:
+            self.flush()
+        try:
+            self._buffer.release()
+            self._mmap.close()
+        except BufferError:
+            # Arrays handed out still point into the mapping, dropping our
+            # references lets the last of them unmap it when it goes away
+            pass
+        self._buffer = None
+        self._mmap = None
+
+    def flush(self):
+        """
+        Write patched values back to the file and update its modification time,
+        so that parse caches keyed on it read the file again
+        """
+        self._mmap.flush()
+        os.utime(self.filename)
+
+    def _release_views(self):
+        """
+        Drop the views into the mapping held by the file itself, called by close
+        """
+        pass
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+import numpy
+
+# Bump when the cached representation of a file changes, so old entries are not reused
+CACHE_VERSION = 2
+
+_unset = object()
+_default_cache = _unset
+
+
+class ParseCache:
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        """
+        On-disk cache of decoded BH3/BHA files
+        Entries are keyed on a hash of the file content and hold the decoded arrays as
+        .npy files, which are memory-mapped copy-on-write when loaded. A second key made
+        from the path, mtime and size lets unchanged files skip reading and hashing.
+        Once the cache grows past max_bytes, least recently used entries are evicted until
+        it is back under three quarters of it, so eviction runs rarely instead of on every store.
+        :param directory: folder that holds the cache, created if needed
+        :param max_bytes: size budget of all entries together
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Running estimate of the size of all entries, None until the cache is first scanned
+        self._total_bytes = None
+        self._entries = os.path.join(directory, 'entries')
+        self._paths = os.path.join(directory, 'paths')
+        os.makedirs(self._entries, exist_ok=True)
+        os.makedirs(self._paths, exist_ok=True)
+
+    def lookup(self, filename, data=None):
+        """
+        Find the cache entry of a file
+        :param filename: The location of the file on the system
+        :param data: content of the file; if None only the path, mtime and size are checked
+        :return: (key, entry) where entry is None on a miss, and key is None if data was not given
+        """
+        path_key = self._path_key(filename)
+        if data is None:
+            try:
+                with open(os.path.join(self._paths, path_key), 'r') as f:
+                    key = f.read()
+            except OSError:
+                return None, None
+            return key, self._load(key)
+
+        key = hashlib.sha1(b'%d:' % CACHE_VERSION + data).hexdigest()
+        entry = self._load(key)
+        if entry is not None:
+            self._write_path_key(path_key, key)
+        return key, entry
+
+    def store(self, key, filename, arrays, meta):
+        """
+        Add an entry to the cache and evict old entries if the cache is over budget
+        :param key: content key returned by lookup
+        :param filename: The location of the cached file on the system
+        :param arrays: dict of name to numpy array
+        :param meta: JSON serializable data stored with the arrays
+        """
+        # The cache is best effort, failing to write to it must not fail the read
+        entry_directory = os.path.join(self._entries, key)
+        temp_directory = '{}.{}.tmp'.format(entry_directory, uuid.uuid4().hex)
+        entry_bytes = 0
+        try:
+            os.makedirs(temp_directory)
+            for name, array in arrays.items():
+                numpy.save(os.path.join(temp_directory, name + '.npy'), array)
+            with open(os.path.join(temp_directory, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            entry_bytes = self._entry_size(temp_directory)
+            os.rename(temp_directory, entry_directory)
+        except OSError:
+            # Another process may have stored the same entry first
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            if not os.path.isdir(entry_directory):
+                return
+            entry_bytes = 0
+
+        try:
+            self._write_path_key(self._path_key(filename), key)
+            if self._total_bytes is None:
+                self._total_bytes = self._scan()[1]
+            else:
+                self._total_bytes += entry_bytes
+            if self._total_bytes > self.max_bytes:
+                self.evict()
+        except OSError:
+            pass
+
+    def evict(self, target_bytes=None):
+        """
+        Remove least recently used entries until the cache fits in target_bytes,
+        and remove the path keys of entries that no longer exist
+        :param target_bytes: size to shrink the cache to, three quarters of max_bytes by default
+        """
+        if target_bytes is None:
+            target_bytes = self.max_bytes * 3 // 4
+        entries, total = self._scan()
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= target_bytes:
+                break
+            try:
+                shutil.rmtree(path)
+                total -= size
+            except OSError:
+                # Still mapped by a reader on some platforms, try again next time
+                pass
+        self._total_bytes = total
+        self._prune_path_keys()
+
+    def _scan(self):
+        """
+        :return: (list of (mtime, size, path) of every entry, total size)
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self._entries):
+            if not entry.is_dir() or entry.name.endswith('.tmp'):
+                continue
+            size = self._entry_size(entry.path)
+            entries.append((entry.stat().st_mtime, size, entry.path))
+            total += size
+        return entries, total
+
+    @staticmethod
+    def _entry_size(path):
+        return sum(f.stat().st_size for f in os.scandir(path))
+
+    def _prune_path_keys(self):
+        """
+        Remove the path keys that point to evicted entries
+        """
+        for path_key in os.scandir(self._paths):
+            try:
+                with open(path_key.path, 'r') as f:
+                    key = f.read()
+                if not os.path.isdir(os.path.join(self._entries, key)):
+                    os.remove(path_key.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        self._total_bytes = 0
+        shutil.rmtree(self._entries, ignore_errors=True)
+        shutil.rmtree(self._paths, ignore_errors=True)
+        os.makedirs(self._entries, exist_ok=True)
+        os.makedirs(self._paths, exist_ok=True)
+
+    def _load(self, key):
+        entry_directory = os.path.join(self._entries, key)
+        try:
+            with open(os.path.join(entry_directory, 'meta.json'), 'r') as f:
+                entry = {'meta': json.load(f)}
+            for name in os.listdir(entry_directory):
+                if name.endswith('.npy'):
+                    entry[name[:-4]] = numpy.load(os.path.join(entry_directory, name), mmap_mode='c')
+            os.utime(entry_directory)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def _path_key(self, filename):
+        stat = os.stat(filename)
+        path = '{}|{}|{}|{}'.format(os.path.abspath(filename), stat.st_mtime_ns, stat.st_size, CACHE_VERSION)
+        return hashlib.sha1(path.encode('utf-8')).hexdigest()
+
+    def _write_path_key(self, path_key, key):
+        temp = os.path.join(self._paths, '{}.{}.tmp'.format(path_key, uuid.uuid4().hex))
+        with open(temp, 'w') as f:
+            f.write(key)
+        os.replace(temp, os.path.join(self._paths, path_key))
+
+
+def get_default_cache():
+    """
+    The cache used by BH3File.read and BHAFile.read when none is passed
+    Unless set_default_cache was called, it is created from the RISEOFNATIONS_CACHE
+    environment variable (a directory) and RISEOFNATIONS_CACHE_MB (size budget in MB).
+    """
+    global _default_cache
+    if _default_cache is _unset:
+        directory = os.environ.get('RISEOFNATIONS_CACHE')
+        if directory:
+            max_megabytes = float(os.environ.get('RISEOFNATIONS_CACHE_MB', 512))
+            _default_cache = ParseCache(directory, int(max_megabytes * 1024 * 1024))
+        else:
+            _default_cache = None
+    return _default_cache
+
+
+def set_default_cache(cache):
+    """
+    Set the cache used by BH3File.read and BHAFile.read, or None to disable it
+    """
+    global _default_cache
+    _default_cache = cache
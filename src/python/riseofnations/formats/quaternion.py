@@ -0,0 +1,99 @@
+import numpy
+
+# Quaternions are stored as [w, x, y, z] along the last axis, matching BH3Bone.rotation
+# and BHABoneTrack.key_data. All functions broadcast over the leading axes.
+
+
+def multiply(a, b):
+    """
+    Hamilton product a * b, the rotation b followed by a
+    """
+    aw, ax, ay, az = numpy.moveaxis(numpy.asarray(a, dtype=numpy.float64), -1, 0)
+    bw, bx, by, bz = numpy.moveaxis(numpy.asarray(b, dtype=numpy.float64), -1, 0)
+    return numpy.stack((aw * bw - ax * bx - ay * by - az * bz,
+                        aw * bx + ax * bw + ay * bz - az * by,
+                        aw * by - ax * bz + ay * bw + az * bx,
+                        aw * bz + ax * by - ay * bx + az * bw), axis=-1)
+
+
+def conjugate(q):
+    return numpy.asarray(q, dtype=numpy.float64) * (1.0, -1.0, -1.0, -1.0)
+
+
+def inverse(q):
+    q = numpy.asarray(q, dtype=numpy.float64)
+    return conjugate(q) / numpy.sum(q * q, axis=-1, keepdims=True)
+
+
+def normalize(q):
+    q = numpy.asarray(q, dtype=numpy.float64)
+    return q / numpy.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def rotate(q, v):
+    """
+    Rotate the vectors v by the unit quaternions q
+    """
+    q = numpy.asarray(q, dtype=numpy.float64)
+    v = numpy.asarray(v, dtype=numpy.float64)
+    u = q[..., 1:]
+    t = 2.0 * numpy.cross(u, v)
+    return v + q[..., :1] * t + numpy.cross(u, t)
+
+
+def to_matrix(q):
+    """
+    3x3 rotation matrices of the unit quaternions q, for column vectors
+    """
+    w, x, y, z = numpy.moveaxis(numpy.asarray(q, dtype=numpy.float64), -1, 0)
+    return numpy.stack((numpy.stack((1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)), axis=-1),
+                        numpy.stack((2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)), axis=-1),
+                        numpy.stack((2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)), axis=-1)),
+                       axis=-2)
+
+
+def make_continuous(q):
+    """
+    Flip the signs of a sequence of quaternions so each one is on the shortest arc from the one before
+    A quaternion is kept when its dot product with the previous (unflipped) one is positive, the flips
+    are then propagated with a cumulative product.
+    :param q: Nx4 array of quaternions
+    :return: Nx4 array with the same rotations
+    """
+    q = numpy.asarray(q, dtype=numpy.float64)
+    if len(q) < 2:
+        return q.copy()
+    steps = numpy.where(numpy.sum(q[1:] * q[:-1], axis=-1) > 0.0, 1.0, -1.0)
+    signs = numpy.concatenate(([1.0], numpy.cumprod(steps)))
+    return q * signs[:, numpy.newaxis]
+
+
+def slerp(a, b, t):
+    """
+    Spherical linear interpolation from a to b along the shortest arc
+    Nearly parallel quaternions fall back to linear interpolation.
+    :param a: quaternions at t = 0
+    :param b: quaternions at t = 1
+    :param t: interpolation factors, broadcast against the leading axes of a and b
+    :return: the interpolated quaternions
+    """
+    a = numpy.asarray(a, dtype=numpy.float64)
+    b = numpy.asarray(b, dtype=numpy.float64)
+    t = numpy.asarray(t, dtype=numpy.float64)[..., numpy.newaxis]
+    dot = numpy.sum(a * b, axis=-1, keepdims=True)
+    b = numpy.where(dot < 0.0, -b, b)
+    theta = numpy.arccos(numpy.clip(numpy.abs(dot), 0.0, 1.0))
+    sin_theta = numpy.sin(theta)
+    linear = sin_theta < 1.0e-6
+    sin_theta = numpy.where(linear, 1.0, sin_theta)
+    wa = numpy.where(linear, 1.0 - t, numpy.sin((1.0 - t) * theta) / sin_theta)
+    wb = numpy.where(linear, t, numpy.sin(t * theta) / sin_theta)
+    return wa * a + wb * b
+
+
+def angle_between(a, b):
+    """
+    Angle in radians of the rotation from a to b
+    """
+    dot = numpy.sum(normalize(a) * normalize(b), axis=-1)
+    return 2.0 * numpy.arccos(numpy.clip(numpy.abs(dot), 0.0, 1.0))
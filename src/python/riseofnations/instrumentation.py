@@ -0,0 +1,147 @@
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Span:
+    def __init__(self, name):
+        """
+        Timing of one named phase
+        :param name: The name of the phase
+        """
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_bytes = None
+
+    def as_dict(self):
+        result = {'name': self.name, 'wall_seconds': self.wall_seconds, 'cpu_seconds': self.cpu_seconds}
+        if self.peak_bytes is not None:
+            result['peak_bytes'] = self.peak_bytes
+        return result
+
+
+class Report:
+    def __init__(self, operation, filename, trace_memory=None):
+        """
+        Per-phase wall time, CPU time, and optionally peak memory of an import or export
+        Set RISEOFNATIONS_TRACE_MEMORY=1 to trace memory by default, and RISEOFNATIONS_TIMING_LOG
+        to a file path (or - for stderr) to append each finished report to it as a JSON line.
+        :param operation: What is being measured, such as "BH3 import"
+        :param filename: The file being read or written
+        :param trace_memory: Record the tracemalloc peak of each span, None to use the environment variable.
+        Peaks are only recorded when the report starts tracing itself, tracing started by someone else
+        is left alone, as resetting its peak would change what they measure.
+        """
+        self.operation = operation
+        self.filename = filename
+        self.spans = []
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_bytes = None
+        if trace_memory is None:
+            trace_memory = os.environ.get('RISEOFNATIONS_TRACE_MEMORY', '') not in ('', '0')
+        self._started_tracing = False
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._trace_memory = self._started_tracing
+
+    @contextmanager
+    def span(self, name):
+        """
+        Measure the code in the with block as the named phase
+        Repeated spans with the same name are added together. If the block raises, the report
+        is stopped, and the memory tracing it started is turned off.
+        """
+        if self._trace_memory:
+            self._reset_peak()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            span = self.get_span(name)
+            if span is None:
+                span = Span(name)
+                self.spans.append(span)
+            span.wall_seconds += time.perf_counter() - start_wall
+            span.cpu_seconds += time.process_time() - start_cpu
+            if self._trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                span.peak_bytes = max(span.peak_bytes or 0, peak)
+                self.peak_bytes = max(self.peak_bytes or 0, peak)
+            if failed:
+                self._stop()
+
+    def get_span(self, name):
+        """
+        :return: The span with the given name, or None
+        """
+        for span in self.spans:
+            if span.name == name:
+                return span
+        return None
+
+    def finish(self):
+        """
+        Stop the clock, print a summary, and append the report to RISEOFNATIONS_TIMING_LOG if it is set
+        :return: self
+        """
+        self._stop()
+        print(self.summary())
+        log = os.environ.get('RISEOFNATIONS_TIMING_LOG')
+        if log:
+            line = json.dumps(self.as_dict())
+            if log == '-':
+                print(line, file=sys.stderr)
+            else:
+                with open(log, 'a') as f:
+                    f.write(line + '\n')
+        return self
+
+    def _stop(self):
+        """
+        Stop the clock and the memory tracing started by this report
+        """
+        self.wall_seconds = time.perf_counter() - self._start_wall
+        self.cpu_seconds = time.process_time() - self._start_cpu
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+            self._trace_memory = False
+
+    def summary(self):
+        """
+        :return: One line with the total and the time of each span
+        """
+        phases = ", ".join("{} {:.3f}".format(span.name, span.wall_seconds) for span in self.spans)
+        return "{} took {:f} seconds ({})".format(self.operation, self.wall_seconds, phases)
+
+    def as_dict(self):
+        result = {
+            'operation': self.operation,
+            'file': self.filename,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'spans': [span.as_dict() for span in self.spans],
+        }
+        if self.peak_bytes is not None:
+            result['peak_bytes'] = self.peak_bytes
+        return result
+
+    @staticmethod
+    def _reset_peak():
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:
+            # Python < 3.9, clearing the traces also resets the peak
+            tracemalloc.clear_traces()
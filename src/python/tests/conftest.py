@@ -0,0 +1,26 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from riseofnations.formats import parsecache
+
+data_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '..', '..', '..', 'tests', 'RoNLibrary.Tests', 'data')
+
+
+@pytest.fixture
+def bh3_path():
+    return os.path.join(data_directory, 'ADVFighter.BH3')
+
+
+@pytest.fixture
+def bha_path():
+    return os.path.join(data_directory, 'ADVFighter_attack1.BHa')
+
+
+@pytest.fixture(autouse=True)
+def no_default_cache(monkeypatch):
+    # Keep RISEOFNATIONS_CACHE from the environment out of the tests
+    monkeypatch.setattr(parsecache, '_default_cache', None)
@@ -0,0 +1,13 @@
+import numpy
+from riseofnations import benchmark
+
+
+def test_small_case_has_no_errors():
+    report = benchmark.run([(200, 300, 8, 3, 10)], repeat=2)
+    assert [result['errors'] for result in report['results']] == [[], []]
+
+
+def test_generated_hierarchy_is_depth_first():
+    parents = benchmark.make_hierarchy(20, 4, numpy.random.default_rng(0))
+    assert parents[0] == -1
+    assert all(0 <= parent < bi for bi, parent in enumerate(parents) if bi > 0)
@@ -0,0 +1,50 @@
+import numpy
+from riseofnations.formats.bh3.bh3file import BH3File
+
+
+def read(path, **kwargs):
+    file = BH3File()
+    file.read(path, cache=False, **kwargs)
+    return file
+
+
+def test_mesh_arrays_have_matching_lengths(bh3_path):
+    file = read(bh3_path)
+    assert file.vertices.shape == (len(file.normals), 3)
+    assert file.uvs.shape == (len(file.vertices), 2)
+    assert file.faces.shape[1] == 3
+    assert int(file.faces.max()) < len(file.vertices)
+
+
+def test_as_lists_gives_nested_lists(bh3_path):
+    file = read(bh3_path, as_lists=True)
+    arrays = read(bh3_path)
+    assert file.vertices == arrays.vertices.tolist()
+    assert file.faces == arrays.faces.tolist()
+
+
+def test_as_lists_without_mesh(bh3_path):
+    file = read(bh3_path, mesh=False, as_lists=True)
+    assert file.vertices == []
+    assert file.root_bone is not None
+
+
+def test_bone_ranges_cover_the_vertices(bh3_path):
+    file = read(bh3_path)
+    total = 0
+    stack = [file.root_bone]
+    while stack:
+        bone = stack.pop()
+        total += bone.vertex_count
+        stack.extend(bone.children)
+    assert total == len(file.vertices)
+
+
+def test_faces_are_read_in_reverse_winding(bh3_path):
+    file = read(bh3_path)
+    with open(bh3_path, 'rb') as f:
+        data = f.read()
+    index = BH3File.read_index(bh3_path)
+    face_chunk = next(chunk for chunk in index.walk() if chunk.chunk_type == 5)
+    raw = numpy.frombuffer(data, dtype='<u2', count=len(file.faces) * 3, offset=face_chunk.data_offset + 4)
+    assert numpy.array_equal(file.faces, raw.reshape(-1, 3)[:, ::-1])
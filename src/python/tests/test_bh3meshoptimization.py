@@ -0,0 +1,71 @@
+import numpy
+from riseofnations.formats.bh3.bh3file import BH3File
+from riseofnations.formats.bh3.bh3meshoptimization import (average_cache_miss_ratio, optimize_mesh,
+                                                           optimize_vertex_cache, weld_vertices)
+
+
+def grid_faces(size, seed=0):
+    index = numpy.arange(size * size).reshape(size, size)
+    a, b, c, d = index[:-1, :-1].ravel(), index[1:, :-1].ravel(), index[:-1, 1:].ravel(), index[1:, 1:].ravel()
+    faces = numpy.concatenate((numpy.column_stack((a, b, c)), numpy.column_stack((c, b, d))))
+    return faces[numpy.random.default_rng(seed).permutation(len(faces))]
+
+
+def triangles(file):
+    vertices = numpy.hstack((file.vertices, file.normals, file.uvs))
+    return sorted(vertices[face].tobytes() for face in numpy.asarray(file.faces))
+
+
+def bones(file):
+    found = []
+    stack = [file.root_bone]
+    while stack:
+        bone = stack.pop()
+        found.append(bone)
+        stack.extend(bone.children)
+    return found
+
+
+def read(path):
+    file = BH3File()
+    file.read(path, cache=False)
+    return file
+
+
+def test_reorder_keeps_every_triangle():
+    faces = grid_faces(20)
+    optimized = optimize_vertex_cache(faces, 400)
+    assert sorted(map(tuple, optimized.tolist())) == sorted(map(tuple, faces.tolist()))
+
+
+def test_reorder_lowers_acmr():
+    faces = grid_faces(40)
+    optimized = optimize_vertex_cache(faces, 1600)
+    assert average_cache_miss_ratio(optimized) < average_cache_miss_ratio(faces) / 2
+
+
+def test_weld_merges_duplicates_within_a_bone(bh3_path):
+    file = read(bh3_path)
+    bone = max(bones(file), key=lambda b: b.vertex_count)
+    first, second = bone.vertex_index, bone.vertex_index + 1
+    for name in ('vertices', 'normals', 'uvs'):
+        getattr(file, name)[second] = getattr(file, name)[first]
+    assert weld_vertices(file) == 1
+    assert sum(b.vertex_count for b in bones(file)) == len(file.vertices)
+
+
+def test_optimize_keeps_the_mesh(bh3_path):
+    file = read(bh3_path)
+    expected = triangles(file)
+    optimize_mesh(file)
+    assert triangles(file) == expected
+
+
+def test_optimize_keeps_vertices_in_their_bone(bh3_path):
+    file = read(bh3_path)
+    expected = {bone.name: sorted(file.vertices[bone.vertex_index:bone.vertex_index + bone.vertex_count].tolist())
+                for bone in bones(file)}
+    optimize_mesh(file, weld=False)
+    for bone in bones(file):
+        assert sorted(file.vertices[bone.vertex_index:bone.vertex_index + bone.vertex_count].tolist()) == \
+            expected[bone.name]
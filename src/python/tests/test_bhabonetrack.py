@@ -0,0 +1,77 @@
+from riseofnations.formats.bha.bhabonetrack import BHABoneTrack
+from riseofnations.formats.bha.bhabonetrackkey import BHABoneTrackKey
+from riseofnations.formats.bha.bhafile import BHAFile
+
+
+def make_key(time_step):
+    key = BHABoneTrackKey()
+    key.time_step = time_step
+    return key
+
+
+def test_appended_key_is_stored(tmp_path):
+    bone_track = BHABoneTrack()
+    bone_track.keys.append(make_key(0.5))
+    assert len(bone_track.key_data) == 1
+    assert bone_track.key_data['time_step'][0] == 0.5
+
+
+def test_appended_key_is_written(tmp_path):
+    file = BHAFile()
+    file.root_bone_track = BHABoneTrack()
+    file.root_bone_track.keys.append(make_key(0.5))
+    filename = str(tmp_path / 'keys.bha')
+    file.write(filename)
+    read = BHAFile()
+    read.read(filename, cache=False)
+    assert len(read.root_bone_track.key_data) == 1
+
+
+def test_removed_key_is_dropped():
+    bone_track = BHABoneTrack()
+    bone_track.keys = [make_key(0.25), make_key(0.5)]
+    del bone_track.keys[0]
+    assert bone_track.key_data['time_step'].tolist() == [0.5]
+
+
+def test_key_view_writes_through():
+    bone_track = BHABoneTrack()
+    bone_track.add_keys(1)
+    bone_track.keys[0].position = (1, 2, 3)
+    assert bone_track.key_data['position'][0].tolist() == [1, 2, 3]
+
+
+def test_key_view_survives_add_keys():
+    bone_track = BHABoneTrack()
+    bone_track.add_keys(1)
+    key = bone_track.keys[0]
+    bone_track.add_keys(2)
+    key.time_step = 2.0
+    assert bone_track.key_data['time_step'][0] == 2.0
+    assert len(bone_track.keys) == 3
+
+
+def test_key_data_round_trips_through_file(tmp_path, bha_path):
+    file = BHAFile()
+    file.read(bha_path, cache=False)
+    filename = str(tmp_path / 'copy.bha')
+    file.write(filename)
+    copy = BHAFile()
+    copy.read(filename, cache=False)
+    assert copy.root_bone_track.key_data.tobytes() == file.root_bone_track.key_data.tobytes()
+
+
+def test_appending_many_keys_rebuilds_key_data_once(monkeypatch):
+    calls = []
+    store_keys = BHABoneTrack._store_keys
+
+    def counting_store_keys(self):
+        calls.append(len(self._keys))
+        store_keys(self)
+
+    monkeypatch.setattr(BHABoneTrack, '_store_keys', counting_store_keys)
+    bone_track = BHABoneTrack()
+    for ki in range(0, 4000):
+        bone_track.keys.append(make_key(ki))
+    assert bone_track.key_data['time_step'][-1] == 3999
+    assert calls == [4000]
@@ -0,0 +1,77 @@
+import numpy
+from riseofnations.formats import quaternion
+from riseofnations.formats.bha.bhabonetrackkey import create_key_data
+from riseofnations.formats.bha.bhakeyreduction import reduce_key_data
+
+
+def _make_key_data(angles, positions, time_step=0.1):
+    # Rotations about Z by the given angles, stored as wxyz
+    angles = numpy.asarray(angles, dtype=numpy.float64)
+    key_data = create_key_data(len(angles))
+    key_data['time_step'] = time_step
+    key_data['time_step'][0] = 0.0
+    key_data['rotation'][:, 0] = numpy.cos(angles / 2)
+    key_data['rotation'][:, 3] = numpy.sin(angles / 2)
+    key_data['position'] = positions
+    return key_data
+
+
+def _linear_track(count=11):
+    t = numpy.linspace(0.0, 1.0, count)
+    return _make_key_data(t * 1.2, numpy.outer(t, (2.0, -1.0, 0.5)))
+
+
+def _reconstruct(original, reduced):
+    # Interpolate the reduced keys at the times of the original ones
+    times = numpy.cumsum(original['time_step'], dtype=numpy.float64)
+    kept_times = numpy.cumsum(reduced['time_step'], dtype=numpy.float64)
+    end = numpy.clip(numpy.searchsorted(kept_times, times), 1, len(reduced) - 1)
+    start = end - 1
+    t = (times - kept_times[start]) / (kept_times[end] - kept_times[start])
+    positions = reduced['position'][start] + (reduced['position'][end] - reduced['position'][start]) * t[:, numpy.newaxis]
+    rotations = quaternion.slerp(reduced['rotation'][start], reduced['rotation'][end], t)
+    return positions, rotations
+
+
+def test_linear_track_collapses_to_endpoints():
+    key_data = _linear_track()
+    reduced = reduce_key_data(key_data)
+    assert len(reduced) == 2
+    assert reduced[0].tobytes() == key_data[0].tobytes()
+    assert numpy.array_equal(reduced['rotation'][1], key_data['rotation'][-1])
+    assert numpy.array_equal(reduced['position'][1], key_data['position'][-1])
+
+
+def test_reconstructed_keys_are_within_tolerance():
+    rng = numpy.random.RandomState(7)
+    count = 200
+    key_data = _make_key_data(numpy.cumsum(rng.normal(0.0, 0.02, count)),
+                              numpy.cumsum(rng.normal(0.0, 0.01, (count, 3)), axis=0))
+    position_tolerance = 0.02
+    rotation_tolerance = 0.03
+    reduced = reduce_key_data(key_data, position_tolerance, rotation_tolerance)
+    assert 2 < len(reduced) < count
+
+    positions, rotations = _reconstruct(key_data, reduced)
+    # Slack for the float32 time steps and keys
+    assert numpy.linalg.norm(positions - key_data['position'], axis=1).max() <= position_tolerance + 1e-5
+    assert quaternion.angle_between(rotations, key_data['rotation']).max() <= rotation_tolerance + 1e-3
+
+
+def test_time_step_sums_are_preserved():
+    rng = numpy.random.RandomState(3)
+    key_data = _make_key_data(numpy.cumsum(rng.normal(0.0, 0.05, 50)),
+                              numpy.cumsum(rng.normal(0.0, 0.05, (50, 3)), axis=0))
+    key_data['time_step'][1:] = rng.uniform(0.01, 0.2, 49)
+    reduced = reduce_key_data(key_data, 0.01, 0.01)
+
+    times = numpy.cumsum(key_data['time_step'], dtype=numpy.float64)
+    kept_times = numpy.cumsum(reduced['time_step'], dtype=numpy.float64)
+    assert numpy.isclose(kept_times[-1], times[-1], atol=1e-5)
+    assert numpy.all(numpy.min(numpy.abs(kept_times[:, numpy.newaxis] - times), axis=1) < 1e-5)
+
+
+def test_sign_flipped_rotations_add_no_keys():
+    key_data = _linear_track()
+    key_data['rotation'][1::2] *= -1
+    assert len(reduce_key_data(key_data)) == 2
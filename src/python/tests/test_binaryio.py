@@ -0,0 +1,64 @@
+import io
+import numpy
+import pytest
+from riseofnations.fileio.binarybufferreader import BinaryBufferReader
+from riseofnations.fileio.binaryreader import BinaryReader
+from riseofnations.fileio.binarywriter import BinaryWriter
+
+
+def write(byteorder):
+    buffer = io.BytesIO()
+    writer = BinaryWriter(buffer, byteorder)
+    writer.write_uint32(0x01020304)
+    writer.write_array(numpy.array([[1.5, -2.0], [3.25, 4.0]]), 'f')
+    writer.write_array([1, 2, 65535], 'H')
+    return buffer.getvalue()
+
+
+def readers(data, byteorder):
+    return [BinaryReader(io.BytesIO(data), byteorder), BinaryBufferReader(data, byteorder)]
+
+
+@pytest.mark.parametrize('byteorder', ['<', '>'])
+def test_arrays_round_trip(byteorder):
+    data = write(byteorder)
+    for reader in readers(data, byteorder):
+        assert reader.read_uint32() == 0x01020304
+        floats = reader.read_array('f', (2, 2))
+        assert floats.tolist() == [[1.5, -2.0], [3.25, 4.0]]
+        assert reader.read_array('H', 3).tolist() == [1, 2, 65535]
+        assert reader.tell() == len(data)
+        floats[0, 0] = 0.0
+
+
+def test_byte_orders_differ():
+    assert write('<')[:4] == b'\x04\x03\x02\x01'
+    assert write('>')[:4] == b'\x01\x02\x03\x04'
+    assert write('<')[4:8] == numpy.array(1.5, '<f4').tobytes()
+    assert write('>')[4:8] == numpy.array(1.5, '>f4').tobytes()
+
+
+@pytest.mark.parametrize('byteorder', ['<', '>'])
+def test_truncated_value_raises_eof(byteorder):
+    for reader in readers(b'\x01\x02\x03', byteorder):
+        with pytest.raises(EOFError):
+            reader.read_uint32()
+
+
+@pytest.mark.parametrize('byteorder', ['<', '>'])
+def test_truncated_array_raises_eof(byteorder):
+    data = write(byteorder)[:-1]
+    for reader in readers(data, byteorder):
+        reader.seek(4 + 16)
+        with pytest.raises(EOFError):
+            reader.read_array('H', 3)
+
+
+def test_truncated_buffer_leaves_offset():
+    reader = BinaryBufferReader(b'\x01\x02\x03')
+    reader.read_ubyte()
+    with pytest.raises(EOFError):
+        reader.read_uint32()
+    with pytest.raises(EOFError):
+        reader.read_array('H', 2)
+    assert reader.tell() == 1
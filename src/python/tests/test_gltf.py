@@ -0,0 +1,100 @@
+import json
+import os
+import struct
+import numpy
+import pytest
+from riseofnations.formats.bh3.bh3file import BH3File
+from riseofnations.formats.bha.bhafile import BHAFile
+from riseofnations.formats.gltf.bh3gltfconverter import BH3GltfConverter
+from conftest import data_directory
+
+_component_dtypes = {5121: numpy.uint8, 5123: numpy.uint16, 5126: numpy.float32}
+_type_widths = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT4': 16}
+
+
+def _read_glb(filename):
+    with open(filename, 'rb') as f:
+        data = f.read()
+    json_length, = struct.unpack_from('<L', data, 12)
+    gltf = json.loads(data[20:20 + json_length].decode('utf-8'))
+    bin_length, = struct.unpack_from('<L', data, 20 + json_length)
+    return gltf, data[28 + json_length:28 + json_length + bin_length]
+
+
+def _accessor(glb, index):
+    gltf, data = glb
+    accessor = gltf['accessors'][index]
+    view = gltf['bufferViews'][accessor['bufferView']]
+    width = _type_widths[accessor['type']]
+    return numpy.frombuffer(data, _component_dtypes[accessor['componentType']], accessor['count'] * width,
+                            view.get('byteOffset', 0) + accessor.get('byteOffset', 0)).reshape(-1, width)
+
+
+@pytest.fixture
+def converted(tmp_path, bh3_path, bha_path):
+    bh3_file = BH3File()
+    bh3_file.read(bh3_path)
+    bha_file = BHAFile()
+    bha_file.read(bha_path)
+    output = str(tmp_path / 'ADVFighter.glb')
+    BH3GltfConverter('ADVFighter').save(output, bh3_file, {'ADVFighter_attack1': bha_file})
+    return _read_glb(output)
+
+
+@pytest.fixture
+def reference():
+    return _read_glb(os.path.join(data_directory, 'ADVFighter_attack1.glb'))
+
+
+def test_nodes_match_reference(converted, reference):
+    nodes = converted[0]['nodes']
+    reference_nodes = reference[0]['nodes']
+    assert [n['name'] for n in nodes] == [n['name'] for n in reference_nodes]
+    for node, reference_node in zip(nodes, reference_nodes):
+        assert node.get('children', []) == reference_node.get('children', [])
+        for path in ('rotation', 'translation'):
+            if path in reference_node:
+                assert numpy.allclose(node[path], reference_node[path], atol=1e-5)
+
+
+def test_inverse_bind_matrices_match_reference(converted, reference):
+    skin = converted[0]['skins'][0]
+    reference_skin = reference[0]['skins'][0]
+    assert skin['joints'] == reference_skin['joints']
+    assert numpy.allclose(_accessor(converted, skin['inverseBindMatrices']),
+                          _accessor(reference, reference_skin['inverseBindMatrices']), atol=1e-5)
+
+
+def test_mesh_accessor_counts_match_reference(converted, reference):
+    primitive = converted[0]['meshes'][0]['primitives'][0]
+    reference_primitive = reference[0]['meshes'][0]['primitives'][0]
+    assert primitive['attributes'].keys() == reference_primitive['attributes'].keys()
+    for name, index in primitive['attributes'].items():
+        assert (converted[0]['accessors'][index]['count'] ==
+                reference[0]['accessors'][reference_primitive['attributes'][name]]['count'])
+    assert (converted[0]['accessors'][primitive['indices']]['count'] ==
+            reference[0]['accessors'][reference_primitive['indices']]['count'])
+
+
+def test_animation_samplers_match_reference(converted, reference):
+    animation = converted[0]['animations'][0]
+    reference_animation = reference[0]['animations'][0]
+    assert animation['name'] == reference_animation['name']
+    assert len(animation['channels']) == len(reference_animation['channels'])
+    for channel, reference_channel in zip(animation['channels'], reference_animation['channels']):
+        assert channel['target'] == reference_channel['target']
+        sampler = animation['samplers'][channel['sampler']]
+        reference_sampler = reference_animation['samplers'][reference_channel['sampler']]
+        assert sampler.get('interpolation', 'LINEAR') == reference_sampler.get('interpolation', 'LINEAR')
+        assert numpy.allclose(_accessor(converted, sampler['input']),
+                              _accessor(reference, reference_sampler['input']), atol=1e-5)
+        assert numpy.allclose(_accessor(converted, sampler['output']),
+                              _accessor(reference, reference_sampler['output']), atol=1e-5)
+
+
+def test_unsupported_texture_format_raises(tmp_path, bh3_path):
+    bh3_file = BH3File()
+    bh3_file.read(bh3_path)
+    with pytest.raises(ValueError):
+        BH3GltfConverter().save(str(tmp_path / 'ADVFighter.glb'), bh3_file,
+                                texture_filename=os.path.join(data_directory, 'ADVFighter.tga'))
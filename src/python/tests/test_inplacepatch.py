@@ -0,0 +1,65 @@
+import os
+import shutil
+import numpy
+import pytest
+from riseofnations.formats.bh3.bh3file import BH3File
+from riseofnations.formats.bh3.bh3mappedfile import BH3MappedFile
+from riseofnations.formats.bha.bhafile import BHAFile
+from riseofnations.formats.bha.bhamappedfile import BHAMappedFile
+
+
+@pytest.fixture
+def bh3_copy(tmp_path, bh3_path):
+    filename = str(tmp_path / 'patched.bh3')
+    shutil.copy(bh3_path, filename)
+    return filename
+
+
+@pytest.fixture
+def bha_copy(tmp_path, bha_path):
+    filename = str(tmp_path / 'patched.bha')
+    shutil.copy(bha_path, filename)
+    return filename
+
+
+def test_patched_bone_transform_reads_back(bh3_copy):
+    with BH3MappedFile(bh3_copy, writable=True) as mapped:
+        mapped.set_bone_transform(0, rotation=(0.0, 1.0, 0.0, 0.0), position=(1.0, 2.0, 3.0))
+    file = BH3File()
+    file.read(bh3_copy, cache=False)
+    assert list(file.root_bone.rotation) == [0.0, 1.0, 0.0, 0.0]
+    assert list(file.root_bone.position) == [1.0, 2.0, 3.0]
+
+
+def test_patching_keeps_file_size(bh3_copy):
+    size = os.path.getsize(bh3_copy)
+    with BH3MappedFile(bh3_copy, writable=True) as mapped:
+        mapped.set_bone_transform(0, position=(1.0, 2.0, 3.0))
+    assert os.path.getsize(bh3_copy) == size
+
+
+def test_read_only_file_refuses_patches(bh3_path):
+    with BH3MappedFile(bh3_path) as mapped:
+        with pytest.raises(ValueError):
+            mapped.set_bone_transform(0, position=(1.0, 2.0, 3.0))
+
+
+def test_wrong_rotation_length_is_refused(bh3_copy):
+    with BH3MappedFile(bh3_copy, writable=True) as mapped:
+        with pytest.raises(ValueError):
+            mapped.set_bone_transform(0, rotation=(1.0, 0.0, 0.0))
+
+
+def test_patched_keys_read_back(bha_copy):
+    with BHAMappedFile(bha_copy, writable=True) as mapped:
+        mapped.set_keys(0, position=(1.0, 2.0, 3.0))
+    file = BHAFile()
+    file.read(bha_copy, cache=False)
+    positions = file.root_bone_track.key_data['position']
+    assert numpy.array_equal(positions, numpy.broadcast_to([1.0, 2.0, 3.0], positions.shape))
+
+
+def test_mismatched_key_values_are_refused(bha_copy):
+    with BHAMappedFile(bha_copy, writable=True) as mapped:
+        with pytest.raises(ValueError):
+            mapped.set_keys(0, time_step=numpy.zeros(mapped.bone_tracks[0].key_count + 1))
@@ -0,0 +1,95 @@
+import json
+import time
+import tracemalloc
+import pytest
+from riseofnations.instrumentation import Report
+
+
+@pytest.fixture(autouse=True)
+def no_environment(monkeypatch):
+    monkeypatch.delenv('RISEOFNATIONS_TIMING_LOG', raising=False)
+    monkeypatch.delenv('RISEOFNATIONS_TRACE_MEMORY', raising=False)
+
+
+def test_nested_spans_are_recorded_separately():
+    report = Report("test", "file")
+    with report.span("outer"):
+        with report.span("inner"):
+            time.sleep(0.01)
+        with report.span("inner"):
+            time.sleep(0.01)
+    assert [span.name for span in report.spans] == ["inner", "outer"]
+    inner = report.get_span("inner")
+    outer = report.get_span("outer")
+    assert inner.wall_seconds >= 0.02
+    assert outer.wall_seconds >= inner.wall_seconds
+    assert report.get_span("missing") is None
+
+
+def test_failed_span_stops_report():
+    report = Report("test", "file")
+    with pytest.raises(RuntimeError):
+        with report.span("read"):
+            raise RuntimeError()
+    assert report.get_span("read") is not None
+    assert report.wall_seconds > 0.0
+
+
+def test_finish_prints_summary(capsys):
+    report = Report("test", "file")
+    with report.span("read"):
+        pass
+    assert report.finish() is report
+    assert report.wall_seconds >= report.get_span("read").wall_seconds
+    assert capsys.readouterr().out.startswith("test took ")
+
+
+def test_finish_appends_json_log(tmp_path, monkeypatch):
+    log = tmp_path / 'timing.log'
+    monkeypatch.setenv('RISEOFNATIONS_TIMING_LOG', str(log))
+    for name in ("first", "second"):
+        report = Report(name, "file")
+        with report.span("read"):
+            pass
+        report.finish()
+    lines = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [line['operation'] for line in lines] == ["first", "second"]
+    assert lines[0]['file'] == "file"
+    assert [span['name'] for span in lines[0]['spans']] == ["read"]
+    assert 'peak_bytes' not in lines[0]
+
+
+def test_finish_logs_json_to_stderr(monkeypatch, capsys):
+    monkeypatch.setenv('RISEOFNATIONS_TIMING_LOG', '-')
+    Report("test", "file").finish()
+    assert json.loads(capsys.readouterr().err)['operation'] == "test"
+
+
+def test_owned_tracing_records_peaks_and_stops():
+    if tracemalloc.is_tracing():
+        pytest.skip("tracemalloc is already tracing")
+    report = Report("test", "file", trace_memory=True)
+    with report.span("allocate"):
+        data = bytearray(1024 * 1024)
+    del data
+    report.finish()
+    assert report.get_span("allocate").peak_bytes >= 1024 * 1024
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracing_started_elsewhere_is_left_alone(monkeypatch):
+    if tracemalloc.is_tracing():
+        pytest.skip("tracemalloc is already tracing")
+    resets = []
+    monkeypatch.setattr(Report, '_reset_peak', staticmethod(lambda: resets.append(True)))
+    tracemalloc.start()
+    try:
+        report = Report("test", "file", trace_memory=True)
+        with report.span("read"):
+            pass
+        report.finish()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+    assert resets == []
+    assert report.peak_bytes is None
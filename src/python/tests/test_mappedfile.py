@@ -0,0 +1,44 @@
+import numpy
+from riseofnations.formats.bh3.bh3file import BH3File
+from riseofnations.formats.bh3.bh3mappedfile import BH3MappedFile
+from riseofnations.formats.bha.bhafile import BHAFile
+from riseofnations.formats.bha.bhamappedfile import BHAMappedFile
+
+
+def test_mapped_bh3_arrays_match_parsed(bh3_path):
+    parsed = BH3File()
+    parsed.read(bh3_path, cache=False)
+    with BH3MappedFile(bh3_path) as mapped:
+        for name in ('vertices', 'normals', 'uvs', 'faces'):
+            assert numpy.array_equal(getattr(mapped, name), getattr(parsed, name)), name
+
+
+def test_mapped_bh3_bones_match_parsed(bh3_path):
+    parsed = BH3File()
+    parsed.read(bh3_path, cache=False)
+    with BH3MappedFile(bh3_path) as mapped:
+        pairs = [(mapped.root_bone, parsed.root_bone)]
+        while pairs:
+            a, b = pairs.pop()
+            assert (a.name, a.vertex_index, a.vertex_count) == (b.name, b.vertex_index, b.vertex_count)
+            assert len(a.children) == len(b.children)
+            pairs.extend(zip(a.children, b.children))
+
+
+def test_mapped_bha_keys_match_parsed(bha_path):
+    parsed = BHAFile()
+    parsed.read(bha_path, cache=False)
+    with BHAMappedFile(bha_path) as mapped:
+        assert mapped.bone_tracks[0].key_data.tobytes() == parsed.root_bone_track.key_data.tobytes()
+
+
+def test_bh3_arrays_outlive_the_file(bh3_path):
+    with BH3MappedFile(bh3_path) as mapped:
+        vertices = mapped.vertices
+    assert numpy.isfinite(vertices).all()
+
+
+def test_bha_key_records_outlive_the_file(bha_path):
+    with BHAMappedFile(bha_path) as mapped:
+        records = mapped.bone_tracks[0].key_records
+    assert len(records) == mapped.bone_tracks[0].key_count
@@ -0,0 +1,92 @@
+import shutil
+import numpy
+from riseofnations.formats.bh3.bh3file import BH3File
+from riseofnations.formats.bha.bhafile import BHAFile
+from riseofnations.formats.parsecache import ParseCache
+
+
+def test_first_read_misses_and_stores(tmp_path, bh3_path):
+    cache = ParseCache(str(tmp_path / 'cache'))
+    assert cache.lookup(bh3_path) == (None, None)
+    BH3File().read(bh3_path, cache=cache)
+    key, entry = cache.lookup(bh3_path)
+    assert entry is not None
+
+
+def test_cached_bh3_read_matches_parsed(tmp_path, bh3_path):
+    cache = ParseCache(str(tmp_path / 'cache'))
+    BH3File().read(bh3_path, cache=cache)
+    cached = BH3File()
+    cached.read(bh3_path, cache=cache)
+    parsed = BH3File()
+    parsed.read(bh3_path, cache=False)
+    for name in ('vertices', 'normals', 'uvs', 'faces'):
+        assert numpy.array_equal(getattr(cached, name), getattr(parsed, name))
+    assert cached.root_bone.name == parsed.root_bone.name
+
+
+def test_cached_bha_read_matches_parsed(tmp_path, bha_path):
+    cache = ParseCache(str(tmp_path / 'cache'))
+    BHAFile().read(bha_path, cache=cache)
+    cached = BHAFile()
+    cached.read(bha_path, cache=cache)
+    parsed = BHAFile()
+    parsed.read(bha_path, cache=False)
+    assert cached.root_bone_track.key_data.tobytes() == parsed.root_bone_track.key_data.tobytes()
+
+
+def test_copy_with_same_content_hits(tmp_path, bh3_path):
+    cache = ParseCache(str(tmp_path / 'cache'))
+    BH3File().read(bh3_path, cache=cache)
+    copy = str(tmp_path / 'copy.bh3')
+    shutil.copy(bh3_path, copy)
+    with open(copy, 'rb') as f:
+        key, entry = cache.lookup(copy, f.read())
+    assert entry is not None
+
+
+def test_changed_content_misses(tmp_path, bh3_path):
+    cache = ParseCache(str(tmp_path / 'cache'))
+    copy = str(tmp_path / 'copy.bh3')
+    shutil.copy(bh3_path, copy)
+    BH3File().read(copy, cache=cache)
+    with open(copy, 'r+b') as f:
+        f.seek(-4, 2)
+        f.write(b'\x00\x00\x80\x3f')
+    with open(copy, 'rb') as f:
+        key, entry = cache.lookup(copy, f.read())
+    assert entry is None
+
+
+def test_eviction_keeps_cache_in_budget(tmp_path, bh3_path, bha_path):
+    cache = ParseCache(str(tmp_path / 'cache'), max_bytes=1)
+    BH3File().read(bh3_path, cache=cache)
+    BHAFile().read(bha_path, cache=cache)
+    assert len(list((tmp_path / 'cache' / 'entries').iterdir())) <= 1
+
+
+def test_eviction_prunes_path_keys(tmp_path, bh3_path, bha_path):
+    cache = ParseCache(str(tmp_path / 'cache'), max_bytes=1)
+    BH3File().read(bh3_path, cache=cache)
+    BHAFile().read(bha_path, cache=cache)
+    entries = {p.name for p in (tmp_path / 'cache' / 'entries').iterdir()}
+    for path_key in (tmp_path / 'cache' / 'paths').iterdir():
+        assert path_key.read_text() in entries
+
+
+def test_store_under_budget_does_not_evict(tmp_path, bh3_path, bha_path, monkeypatch):
+    cache = ParseCache(str(tmp_path / 'cache'))
+    calls = []
+    monkeypatch.setattr(cache, 'evict', lambda: calls.append(True))
+    BH3File().read(bh3_path, cache=cache)
+    BHAFile().read(bha_path, cache=cache)
+    assert calls == []
+    cache.max_bytes = 1
+    copy = str(tmp_path / 'copy.bh3')
+    with open(bh3_path, 'rb') as f:
+        data = bytearray(f.read())
+    data[-1] ^= 1
+    with open(copy, 'wb') as f:
+        f.write(data)
+    BH3File().read(copy, cache=cache)
+    assert calls == [True]
@@ -0,0 +1,83 @@
+import os
+from riseofnations.formats.bh3.bh3file import BH3File
+from riseofnations.formats.bha.bhafile import BHAFile
+
+
+def bone_names(root_bone):
+    names = []
+    stack = [root_bone]
+    while stack:
+        bone = stack.pop()
+        names.append(bone.name)
+        stack.extend(reversed(bone.children))
+    return names
+
+
+def test_index_root_spans_the_file(bh3_path):
+    assert BH3File.read_index(bh3_path).data_size == os.path.getsize(bh3_path)
+
+
+def test_index_names_bones_depth_first(bh3_path):
+    file = BH3File()
+    file.read(bh3_path, cache=False)
+    index_names = [chunk.name for chunk in BH3File.read_index(bh3_path).walk() if chunk.chunk_type == 7]
+    assert index_names == bone_names(file.root_bone)
+
+
+def test_skeleton_only_read_skips_mesh(bh3_path):
+    file = BH3File()
+    file.read(bh3_path, mesh=False)
+    assert len(file.vertices) == 0
+    assert file.root_bone is not None
+
+
+def test_mesh_only_read_skips_skeleton(bh3_path):
+    file = BH3File()
+    file.read(bh3_path, skeleton=False)
+    assert len(file.faces) > 0
+    assert file.root_bone is None
+
+
+def test_partial_track_read_keeps_hierarchy(bha_path):
+    full = BHAFile()
+    full.read(bha_path, cache=False)
+    partial = BHAFile()
+    partial.read(bha_path, bone_tracks=[1])
+    assert len(partial.root_bone_track.key_data) == 0
+    assert len(partial.root_bone_track.children) == len(full.root_bone_track.children)
+
+
+def test_partial_track_read_loads_requested_keys(bha_path):
+    full = BHAFile()
+    full.read(bha_path, cache=False)
+    partial = BHAFile()
+    partial.read(bha_path, bone_tracks=[1])
+    expected = full.root_bone_track.children[0].key_data
+    assert partial.root_bone_track.children[0].key_data.tobytes() == expected.tobytes()
+
+
+def track_key_data(root_bone_track):
+    key_data = []
+    stack = [root_bone_track]
+    while stack:
+        bone_track = stack.pop()
+        key_data.append(bone_track.key_data.tobytes())
+        stack.extend(reversed(bone_track.children))
+    return key_data
+
+
+def test_iterated_tracks_match_read(bha_path):
+    full = BHAFile()
+    full.read(bha_path, cache=False)
+    iterated = [key_data.tobytes() for bone_path, parent_index, key_data in BHAFile().iter_bone_tracks(bha_path)]
+    assert iterated == track_key_data(full.root_bone_track)
+
+
+def test_iterated_tracks_match_partial_read(bha_path):
+    partial = BHAFile()
+    partial.read(bha_path, bone_tracks=[0, 2])
+    file = BHAFile()
+    iterated = [key_data.tobytes() for bone_path, parent_index, key_data in file.iter_bone_tracks(bha_path, [0, 2])]
+    assert iterated == track_key_data(partial.root_bone_track)
+    assert sum(1 for key_data in iterated if key_data) == 2
+    assert vars(file) == {'root_bone_track': None}
@@ -0,0 +1,9 @@
+import pytest
+from riseofnations.formats.bh3.bh3bone import BH3Bone
+from riseofnations.formats.bha.bhabonetrack import BHABoneTrack
+from riseofnations.formats.bha.bhabonetrackkey import BHABoneTrackKey
+
+
+@pytest.mark.parametrize('cls', [BH3Bone, BHABoneTrack, BHABoneTrackKey])
+def test_objects_have_no_instance_dict(cls):
+    assert not hasattr(cls(), '__dict__')
@@ -0,0 +1,77 @@
+import numpy
+from riseofnations.batch import validate_file
+from riseofnations.formats.bh3.bh3file import BH3File
+from riseofnations.formats.bh3.bh3mappedfile import BH3MappedFile
+from riseofnations.formats.bha.bhafile import BHAFile
+
+
+def read_bytes(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+def test_bha_write_is_byte_identical(tmp_path, bha_path):
+    file = BHAFile()
+    file.read(bha_path, cache=False)
+    filename = str(tmp_path / 'copy.bha')
+    file.write(filename)
+    assert read_bytes(filename) == read_bytes(bha_path)
+
+
+def test_bh3_rewrite_is_byte_identical(tmp_path, bh3_path):
+    # The sample's normal padding differs from what the writer emits, so compare two generations
+    file = BH3File()
+    file.read(bh3_path, cache=False)
+    first = str(tmp_path / 'first.bh3')
+    file.write(first)
+    copy = BH3File()
+    copy.read(first, cache=False)
+    second = str(tmp_path / 'second.bh3')
+    copy.write(second)
+    assert read_bytes(second) == read_bytes(first)
+
+
+def test_repeated_writes_are_identical(tmp_path, bh3_path):
+    file = BH3File()
+    file.read(bh3_path, cache=False)
+    first = str(tmp_path / 'first.bh3')
+    second = str(tmp_path / 'second.bh3')
+    file.write(first)
+    file.write(second)
+    assert read_bytes(second) == read_bytes(first)
+
+
+def test_written_bh3_validates(tmp_path, bh3_path):
+    file = BH3File()
+    file.read(bh3_path, cache=False)
+    filename = str(tmp_path / 'copy.bh3')
+    file.write(filename)
+    assert validate_file(filename) == []
+
+
+def test_uv_bits_survive_read_and_write(tmp_path, bh3_path):
+    file = BH3File()
+    file.read(bh3_path, cache=False)
+    original = str(tmp_path / 'original.bh3')
+    file.write(original)
+
+    uv_chunk = next(chunk for chunk in BH3File.read_index(original).walk() if chunk.chunk_type == 4)
+    rng = numpy.random.default_rng(0)
+    uvs = rng.uniform(-1.0, 2.0, size=(len(file.uvs), 2)).astype('<f4')
+    with open(original, 'r+b') as f:
+        f.seek(uv_chunk.data_offset + 4)
+        f.write(uvs.tobytes())
+
+    copy = BH3File()
+    copy.read(original, cache=False)
+    filename = str(tmp_path / 'copy.bh3')
+    copy.write(filename)
+    assert read_bytes(filename) == read_bytes(original)
+
+
+def test_mapped_uvs_match_parsed(bh3_path):
+    file = BH3File()
+    file.read(bh3_path, cache=False)
+    with BH3MappedFile(bh3_path) as mapped:
+        assert mapped.uvs.dtype == file.uvs.dtype
+        assert numpy.array_equal(mapped.uvs, file.uvs)